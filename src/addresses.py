@@ -0,0 +1,158 @@
+"""
+Addresses
+---------
+Builds the street and full-address fields of the NYC inspections data, and
+canonicalizes addresses so that inspections ("18 EAST   23 STREET") and Yelp
+("18 E 23rd St") spell the same address the same way ("18 E 23 ST").
+
+The row-wise functions are kept as the reference implementation; the
+vectorized versions produce identical output for whole columns and are what
+the loaders use.
+"""
+
+import functools
+import re
+
+import numpy as np
+import pandas as pd
+
+
+#####################################################################
+# Address canonicalization.
+
+# Canonical (USPS) abbreviations of street types and directionals.
+STREET_TYPES = {
+    'ALLEY':'ALY', 'AV':'AVE', 'AVE':'AVE', 'AVENUE':'AVE',
+    'BOULEVARD':'BLVD', 'BLVD':'BLVD', 'BRIDGE':'BRG', 'CIRCLE':'CIR',
+    'COURT':'CT', 'DRIVE':'DR', 'EXPRESSWAY':'EXPY', 'HIGHWAY':'HWY',
+    'LANE':'LN', 'PARKWAY':'PKWY', 'PKY':'PKWY', 'PLACE':'PL',
+    'PLAZA':'PLZ', 'ROAD':'RD', 'SQUARE':'SQ', 'STREET':'ST', 'STR':'ST',
+    'TERRACE':'TER', 'TURNPIKE':'TPKE',
+    }
+DIRECTIONALS = {'NORTH':'N', 'SOUTH':'S', 'EAST':'E', 'WEST':'W'}
+ORDINAL_WORDS = {
+    'FIRST':'1', 'SECOND':'2', 'THIRD':'3', 'FOURTH':'4', 'FIFTH':'5',
+    'SIXTH':'6', 'SEVENTH':'7', 'EIGHTH':'8', 'NINTH':'9', 'TENTH':'10',
+    'ELEVENTH':'11', 'TWELFTH':'12',
+    }
+TOKENS = dict(STREET_TYPES, **DIRECTIONALS, **ORDINAL_WORDS)
+
+# Unit designators; they and everything after them are stripped.
+_UNIT = re.compile(r'(\b\d+(ST|ND|RD|TH)\s+)?(#|\b(APT|APARTMENT|STE|SUITE|'
+                   r'UNIT|FL|FLR|FLOOR|RM|ROOM|BSMT|BASEMENT|LOBBY)\b).*$')
+_ORDINAL = re.compile(r'^(\d+)(ST|ND|RD|TH)$')
+# Punctuation, except hyphens of Queens-style building numbers (37-12).
+_PUNCTUATION = re.compile(r'[^\w\s#-]|-(?!\d)|(?<!\d)-')
+
+MEMO_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def _canonical_address (address):
+    text = _PUNCTUATION.sub(' ', address.upper().replace("'", ''))
+    text = _UNIT.sub('', text)
+    tokens = []
+    for token in text.split():
+        ordinal = _ORDINAL.match(token)
+        if ordinal:
+            token = ordinal.group(1)
+        tokens.append(TOKENS.get(token, token))
+    return ' '.join(tokens)
+
+
+def canonical_address (address):
+    """Canonical form of a street address: upper case without punctuation,
+    units (APT 2, SUITE 100, 2ND FL, #5) stripped, ordinals as numbers (23RD
+    and THIRD become 23 and 3) and directionals and street types abbreviated.
+    Non-string values are returned unchanged.
+
+    Example: 'East 23rd Street, Suite 4' -> 'E 23 ST'.
+    """
+    if not isinstance(address, str):
+        return address
+    return _canonical_address(address)
+
+
+def canonical_addresses (values):
+    """Vectorized canonical_address(), canonicalizing each distinct value of
+    Series once.
+    """
+    codes, uniques = pd.factorize(values)
+    # Trailing None is picked by code -1 (missing), then replaced below.
+    canonical = np.array([canonical_address(u) for u in uniques] + [None],
+                         dtype=object)
+    result = np.where(codes >= 0, canonical[codes],
+                      values.to_numpy(dtype=object))
+    return pd.Series(result, index=values.index, dtype=object)
+
+
+#####################################################################
+# Row-wise functions.
+
+def clean_street_address (address):
+    """Remove redundant spaces in STREET column."""
+    try:
+        return ' '.join(address.split())
+    except:
+        return address
+
+
+def create_full_address_old (row):
+    """Create location search term used for Yelp API by combining fields.
+    Was used to build address used as the location search term for Yelp API.
+    """
+    if row['BUILDING'] == 'NKA':
+        return '{0}, {1}'.format(row['STREET'], row['ZIPCODE'])
+    return '{0} {1}, {2}'.format(row['BUILDING'], row['STREET'], row['ZIPCODE'])
+
+
+def create_full_address (row):
+    """Create representation of address in same format as the address field
+    from Yelp's API, canonicalized (see canonical_address).
+    """
+    if row['BUILDING'] == 'NKA':
+        return canonical_address(row['STREET'])
+    return canonical_address('{0} {1}'.format(row['BUILDING'], row['STREET']))
+
+
+#####################################################################
+# Vectorized functions.
+
+def _as_text (values):
+    """Returns str() of every value in Series, formatting each distinct value
+    only once. Missing values become 'nan', as they do with str.format().
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    text = np.array([str(u) for u in uniques], dtype=object)
+    return pd.Series(text[codes], index=values.index, dtype=object)
+
+
+def clean_street_addresses (streets):
+    """Vectorized clean_street_address(). Collapses runs of whitespace in each
+    string of Series; non-string values are returned unchanged.
+    """
+    codes, uniques = pd.factorize(streets)
+    uniques = pd.Series(uniques, dtype=object)
+    cleaned = uniques.str.split().str.join(' ')
+    cleaned = cleaned.where(cleaned.notnull(), uniques).to_numpy(dtype=object)
+    result = np.where(codes >= 0, cleaned[codes], streets.to_numpy(dtype=object))
+    return pd.Series(result, index=streets.index, dtype=object)
+
+
+def create_full_addresses (df):
+    """Vectorized create_full_address() over DF with BUILDING and STREET
+    columns.
+    """
+    nka = (df['BUILDING'] == 'NKA').to_numpy()
+    full = _as_text(df['BUILDING']) + ' ' + _as_text(df['STREET'])
+    return canonical_addresses(full.where(~nka, df['STREET'].astype(object)))
+
+
+def create_full_addresses_old (df):
+    """Vectorized create_full_address_old() over DF with BUILDING, STREET and
+    ZIPCODE columns.
+    """
+    nka = (df['BUILDING'] == 'NKA').to_numpy()
+    street_zip = _as_text(df['STREET']) + ', ' + _as_text(df['ZIPCODE'])
+    full = _as_text(df['BUILDING']) + ' ' + street_zip
+    return full.where(~nka, street_zip)
@@ -0,0 +1,913 @@
+"""
+Benchmarks
+----------
+Timings of the optimized data-preparation routines against the
+implementations they replace. Run from the src directory:
+
+    python benchmarks.py                # all benchmarks
+    python benchmarks.py address_pipeline
+"""
+
+import contextlib
+import copy
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import requests
+
+import addresses
+import bootstrap
+import bridge_store
+import data_prep
+import dates
+import datasets
+import encoding
+import feature_store
+import history
+import frame_cache
+import inspections
+import match_quality
+import model_data
+import pipeline
+import schema
+import similarity
+import yelp
+import yelp_data
+import yelp_index
+
+PATH_INSPECTIONS = datasets.PATH_INSPECTIONS
+PATH_YELP_DATA = datasets.PATH_YELP_DATA
+
+# Most a script module may take to import, on top of its third-party
+# dependencies (seconds).
+IMPORT_BUDGET = 0.1
+
+# Search terms for which the stub Yelp API finds no business.
+NO_MATCH_TERM = 'nomatch'
+
+# Registered benchmarks, by name, in the order they were defined.
+BENCHMARKS = {}
+
+
+def benchmark (func):
+    """Registers func as a benchmark that can be run by name."""
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def best_time (func, *args, repeat=3, **kwargs):
+    """Runs func repeat times and returns (best seconds, last result)."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peak_rss_mb (func, *args):
+    """Runs func(*args) in a fresh process and returns its peak RSS in MB."""
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        return pool.apply(_run_for_rss, (func,) + args)
+
+
+def _run_for_rss (func, *args):
+    func(*args)
+    # High-water mark of this process's own memory (ru_maxrss would include
+    # the parent's, since it survives exec). Linux only.
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])/1e3
+
+
+def report (name, baseline, optimized):
+    """Prints timings of baseline vs. optimized run."""
+    print('{0}: {1:.4f}s -> {2:.4f}s ({3:.1f}x)'.format(
+          name, baseline, optimized, baseline / max(optimized, 1e-9)))
+
+
+#####################################################################
+# Local stand-in for the Yelp API.
+
+class _StubYelpHandler (BaseHTTPRequestHandler):
+    """Answers token, search and business requests like the Yelp API, after
+    sleeping for the server's latency to mimic network round trips.
+    """
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True
+    wbufsize = -1  # send headers and body in one write
+
+    def _send_json (self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST (self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._send_json({'access_token':'stub-token'})
+
+    def do_GET (self):
+        time.sleep(self.server.latency)
+        path = self.path.split('?')[0]
+        if path.startswith(yelp.SEARCH_PATH):
+            term = self.path.split('term=')[1].split('&')[0]
+            if term.startswith(NO_MATCH_TERM):
+                self._send_json({'businesses':[]})
+            else:
+                self._send_json({'businesses':[{'id':'biz-' + term,
+                                                'name':term}]})
+        else:
+            self._send_json({'id':path[len(yelp.BUSINESS_PATH):]})
+
+    def log_message (self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def stub_yelp_api (latency=0.0):
+    """Points the yelp module at a local stub server for the duration of the
+    context.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubYelpHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    saved = yelp.API_HOST, yelp.CLIENT_ID, yelp.SECRET
+    yelp.API_HOST = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    yelp.CLIENT_ID, yelp.SECRET = 'stub-id', 'stub-secret'
+    yelp.obtain_bearer_token.cache_clear()
+    try:
+        yield server
+    finally:
+        yelp.API_HOST, yelp.CLIENT_ID, yelp.SECRET = saved
+        yelp.obtain_bearer_token.cache_clear()
+        yelp.get_client.cache_clear()
+        server.shutdown()
+        server.server_close()
+
+
+#####################################################################
+# Benchmarks.
+
+@benchmark
+def address_pipeline ():
+    """Row-wise vs. vectorized STREET cleaning and FULL_ADDRESS building over
+    the inspections CSV.
+    """
+    df = pd.read_csv(PATH_INSPECTIONS)
+    df = df[df['ZIPCODE'].notnull()]
+    df['ZIPCODE'] = df['ZIPCODE'].astype('int64')
+
+    base, expected = best_time(df['STREET'].apply,
+                               addresses.clean_street_address)
+    fast, result = best_time(addresses.clean_street_addresses, df['STREET'])
+    assert expected.astype(object).equals(result), 'STREET output differs'
+    report('clean_street_addresses', base, fast)
+
+    df['STREET'] = result
+    for name, row_func, vec_func in [
+          ('create_full_addresses', addresses.create_full_address,
+           addresses.create_full_addresses),
+          ('create_full_addresses_old', addresses.create_full_address_old,
+           addresses.create_full_addresses_old)]:
+        base, expected = best_time(df.apply, row_func, axis=1, repeat=1)
+        fast, result = best_time(vec_func, df)
+        assert expected.astype(object).equals(result), name + ' output differs'
+        report(name, base, fast)
+
+
+@benchmark
+def address_canonicalization ():
+    """Row-wise, unmemoized canonicalization of inspection and Yelp
+    addresses vs. addresses.canonical_addresses().
+    """
+    df = pd.read_csv(PATH_INSPECTIONS, usecols=['BUILDING', 'STREET'])
+    yelp_df = pd.read_csv(PATH_YELP_DATA, encoding='ISO-8859-1',
+                          usecols=['address'])
+    values = pd.concat([df['BUILDING'].astype(str) + ' ' + df['STREET'],
+                        yelp_df['address']], ignore_index=True)
+    uncached = addresses._canonical_address.__wrapped__
+
+    def row_wise ():
+        return values.apply(lambda x: uncached(x) if isinstance(x, str)
+                            else x)
+
+    def batched ():
+        addresses._canonical_address.cache_clear()
+        return addresses.canonical_addresses(values)
+
+    base, expected = best_time(row_wise, repeat=1)
+    fast, result = best_time(batched)
+    assert expected.astype(object).equals(result), 'output differs'
+    report('canonical_addresses ({} addresses)'.format(len(values.index)),
+           base, fast)
+
+
+@benchmark
+def yelp_matching ():
+    """Serial vs. concurrent business matching against a stub API with 50ms
+    of latency per search (without rate limiting).
+    """
+    queries = [('biz{}'.format(i), '{} BROADWAY'.format(i)) for i in range(200)]
+    with stub_yelp_api(latency=0.05), yelp.YelpClient() as client:
+        base, expected = best_time(yelp.get_business_matches, queries,
+                                   workers=1, client=client, repeat=1)
+        fast, result = best_time(yelp.get_business_matches, queries,
+                                 workers=yelp.MAX_WORKERS, client=client,
+                                 repeat=1)
+    assert expected == result, 'matches differ or are out of order'
+    report('get_business_matches', base, fast)
+
+
+@benchmark
+def yelp_no_match ():
+    """update_yelp_data() over a block in which the stub API finds no
+    business for every other CAMIS; those are saved to the bridge without a
+    YELP_ID instead of stopping the block.
+    """
+    n = 200
+    inspections_df = pd.DataFrame({
+        'CAMIS':np.arange(40000000, 40000000 + n),
+        'DBA':['{0}{1}'.format(NO_MATCH_TERM if i % 2 else 'biz', i)
+               for i in range(n)],
+        'FULL_ADDRESS':['{} BROADWAY'.format(i) for i in range(n)],
+        'ZIPCODE':10001,
+        })
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        json_url = os.path.join(tmp_dir, 'yelp_data.txt')
+        with stub_yelp_api(), yelp.YelpClient() as client, \
+              bridge_store.BridgeStore(':memory:') as store:
+            seconds, count = best_time(
+                  data_prep.update_yelp_data, n, inspections_df,
+                  index=yelp_index.YelpIndex(), store=store, client=client,
+                  json_url=json_url, repeat=1)
+            bridge_df = store.to_frame()
+        saved = sum(1 for _ in yelp_data.iter_yelp_data(json_url))
+    finally:
+        shutil.rmtree(tmp_dir)
+    assert count == len(bridge_df.index) == n
+    assert bridge_df['YELP_ID'].isnull().sum() == saved == n // 2
+    print('update_yelp_data ({0} CAMIS, {1} without match): {2:.3f}s'.format(
+          n, n // 2, seconds))
+
+
+@benchmark
+def yelp_session ():
+    """Per-request latency of a new connection per request (the previous
+    yelp.request) vs. the pooled keep-alive YelpClient, against a local stub.
+    """
+    ids = ['biz{}'.format(i) for i in range(500)]
+
+    def unpooled (business_id):
+        url = yelp.API_HOST + yelp.BUSINESS_PATH + business_id
+        headers = {'Authorization':'Bearer stub-token'}
+        return requests.request('GET', url, headers=headers).json()
+
+    with stub_yelp_api():
+        base, expected = best_time(lambda: [unpooled(i) for i in ids])
+        with yelp.YelpClient(bearer_token='stub-token') as client:
+            fast, result = best_time(
+                  lambda: [yelp.get_business(i, client=client) for i in ids])
+    assert expected == result, 'responses differ'
+    report('get_business (per request)', base / len(ids), fast / len(ids))
+
+
+def _fake_business (i):
+    """Returns Yelp business JSON like that returned by a search."""
+    biz = {'id':'biz-{}'.format(i), 'name':'Restaurant {}'.format(i),
+           'url':'https://www.yelp.com/biz/biz-{}'.format(i),
+           'phone':'+1212555{:04d}'.format(i%10000),
+           'coordinates':{'latitude':40.7, 'longitude':-74.0},
+           'review_count':i%500, 'rating':(i%9 + 1)/2,
+           'transactions':['pickup', 'delivery'][:i%3],
+           'categories':[{'alias':'pizza', 'title':'Pizza'}],
+           'location':{'address1':'{} Broadway'.format(i), 'city':'New York',
+                       'state':'NY', 'zip_code':'10001'}}
+    if i%4:
+        biz['price'] = '$'*(i%4)
+    return biz
+
+
+@benchmark
+def yelp_df_builder ():
+    """Per-row DataFrame growth (what DataFrame.append did) vs. the columnar
+    builder, from 1K up to 1M business records.
+    """
+    def append_rows (json_data):
+        df = pd.DataFrame(columns=yelp_data.YELP_COLUMNS)
+        for row in json_data:
+            new_row = yelp_data._create_df_entry_from_json(row)
+            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+        return df
+
+    for n in [1000, 2000, 4000]:
+        json_data = [_fake_business(i) for i in range(n)]
+        base, _ = best_time(append_rows, json_data, repeat=1)
+        print('per-row append, {0:>7} rows: {1:.3f}s ({2:.1f}us/row)'.format(
+              n, base, 1e6*base/n))
+    for n in [1000, 10000, 100000, 1000000]:
+        json_data = (_fake_business(i) for i in range(n))
+        fast, df = best_time(yelp_data.build_yelp_df, json_data, repeat=1)
+        assert len(df.index) == n
+        print('build_yelp_df,  {0:>7} rows: {1:.3f}s ({2:.1f}us/row)'.format(
+              n, fast, 1e6*fast/n))
+
+
+@benchmark
+def inspections_cache ():
+    """Parsing and cleaning the inspections CSV vs. loading the cleaned data
+    from the columnar cache.
+    """
+    base, expected = best_time(inspections.load_inspections, PATH_INSPECTIONS,
+                               use_cache=False)
+    inspections.load_inspections(PATH_INSPECTIONS)  # make sure it's cached
+    fast, result = best_time(inspections.load_inspections, PATH_INSPECTIONS)
+    assert frame_cache.pyarrow is not None, 'pyarrow needed for cache'
+    pd.testing.assert_frame_equal(expected, result, check_dtype=False)
+    report('load_inspections', base, fast)
+
+
+@benchmark
+def inspections_schema ():
+    """Resident memory of the inspections DF read with inferred types vs. the
+    declared schema.
+    """
+    base, inferred = best_time(pd.read_csv, PATH_INSPECTIONS, repeat=1)
+    fast, declared = best_time(schema.read_inspections, PATH_INSPECTIONS,
+                               repeat=1)
+    print(schema.memory_report(inferred, declared).to_string())
+    report('read (incl. date parsing)', base, fast)
+
+
+def _load_inspections_uncached (url):
+    inspections.load_inspections(url, use_cache=False)
+
+
+@benchmark
+def chunked_ingestion ():
+    """Peak RSS of loading the inspections CSV whole vs. ingesting it in
+    chunks, for the CSV repeated 1, 4 and 8 times.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        with open(PATH_INSPECTIONS, 'r', encoding='utf-8') as f:
+            header = f.readline()
+            body = f.read()
+        for copies in [1, 4, 8]:
+            url = os.path.join(tmp_dir, 'inspections_x{}.csv'.format(copies))
+            with open(url, 'w', encoding='utf-8') as f:
+                f.write(header)
+                for _ in range(copies):
+                    f.write(body)
+            sink_path = url.replace('.csv', '.parquet')
+            whole = peak_rss_mb(_load_inspections_uncached, url)
+            chunked = peak_rss_mb(inspections.ingest_inspections, url,
+                                  sink_path)
+            print('{0}x CSV: peak RSS {1:.0f} MB whole, {2:.0f} MB '
+                  'chunked'.format(copies, whole, chunked))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def get_excel_date (row):
+    """get_excel_date() of the data_prep notebook, as it was."""
+    if row==row:
+        try:
+            if len(row)==5:
+                return datetime.date(1900, 1, 1) + datetime.timedelta(int(row))
+            else:
+                return pd.to_datetime(row).strftime('%Y-%m-%d')
+        except:
+            None
+    else:
+        return None
+
+
+@benchmark
+def date_parsing ():
+    """Notebook's row-wise get_excel_date() vs. dates.parse_date_columns()
+    over the date columns of the inspections CSV.
+    """
+    cols = schema.INSPECTIONS_DATE_COLUMNS
+    df = pd.read_csv(PATH_INSPECTIONS, usecols=cols, dtype=str)
+
+    def row_wise ():
+        return pd.DataFrame({col:pd.to_datetime(df[col].apply(get_excel_date))
+                             for col in cols})
+
+    base, expected = best_time(row_wise, repeat=1)
+    result = df.copy()
+    unparsed = dates.parse_date_columns(result, cols)
+    fast, _ = best_time(lambda: dates.parse_date_columns(df.copy(), cols))
+    for col in cols:
+        # The notebook read invalid values such as '1' as a day of the
+        # current month; those are reported as unparsed instead.
+        invalid = result[col].isnull() & expected[col].notnull()
+        assert set(df.loc[invalid, col]) <= set(unparsed['value'])
+        assert (result.loc[~invalid, col] == expected.loc[~invalid, col]
+                ).where(expected.loc[~invalid, col].notnull(), True).all()
+    print('unparsed values:')
+    print(unparsed.to_string(index=False))
+    report('parse_date_columns', base, fast)
+
+
+def fix_list_format (row):
+    """fix_list_format() of the data_prep notebook, as it was."""
+    row = str(row)
+    chars = ''''"[]'''
+    for c in chars:
+        row = row.strip().replace(c, "")
+    row = row.replace(",", "|").replace(" ", "")
+    return row
+
+
+@benchmark
+def multi_hot_encoding ():
+    """Notebook's one-pass-per-category encoding vs. MultiHotEncoder, for the
+    Yelp categories of every inspection row.
+    """
+    inspections_df = pd.read_csv(PATH_INSPECTIONS, usecols=['CAMIS'])
+    yelp_df = pd.read_csv(PATH_YELP_DATA, encoding='ISO-8859-1',
+                          usecols=['CAMIS', 'categories'])
+    values = pd.merge(inspections_df, yelp_df, how='left', on='CAMIS'
+                      )['categories'].fillna('NULL')
+
+    def notebook ():
+        column = values.apply(fix_list_format)
+        categories = set()
+        for s in column:
+            categories.update(s.split('|'))
+        return pd.DataFrame({'cat_' + cat:[1 if cat in c.split('|') else 0
+                                           for c in column]
+                             for cat in categories})
+
+    def encoder ():
+        enc = encoding.MultiHotEncoder(prefix='cat_')
+        return enc, enc.fit_transform(encoding.clean_list_format(values))
+
+    base, expected = best_time(notebook, repeat=1)
+    fast, (enc, matrix) = best_time(encoder)
+    result = enc.to_frame(matrix)
+    pd.testing.assert_frame_equal(expected[result.columns], result,
+                                  check_dtype=False)
+    report('MultiHotEncoder ({0} x {1}, {2} non-zeros)'.format(
+           matrix.shape[0], matrix.shape[1], matrix.nnz), base, fast)
+    dense_mb = expected.memory_usage(index=False).sum()/1e6
+    sparse_mb = (matrix.data.nbytes + matrix.indices.nbytes +
+                 matrix.indptr.nbytes)/1e6
+    print('memory: {0:.1f} MB dense -> {1:.1f} MB sparse'.format(dense_mb,
+                                                                  sparse_mb))
+    pruned = encoding.MultiHotEncoder(prefix='cat_', min_count=500)
+    pruned.fit(encoding.clean_list_format(values))
+    print('categories in >= 500 rows: {}'.format(len(pruned.vocabulary)))
+
+
+def _unique_inspections ():
+    """Inspections with valid scores, unique by camis and inspection date
+    (lowest score kept), as prepared in the data_prep notebook.
+    """
+    df = pd.read_csv(PATH_INSPECTIONS, dtype=str,
+                     usecols=['CAMIS', 'INSPECTION.DATE', 'SCORE'])
+    df.columns = ['camis', 'inspection_date', 'score']
+    dates.parse_date_columns(df, ['inspection_date'])
+    df['score'] = pd.to_numeric(df['score'])
+    df = df[(df['score'] >= 0) & df['inspection_date'].notnull()]
+    df = df.sort_values('score').drop_duplicates(['camis', 'inspection_date'])
+    return df.reset_index(drop=True)
+
+
+@benchmark
+def history_features ():
+    """Notebook's self-merge on camis vs. history.history_features()."""
+    data = _unique_inspections()
+
+    def self_merge ():
+        df = pd.merge(data[['camis', 'inspection_date']],
+                      data[['camis', 'inspection_date', 'score']],
+                      on='camis', suffixes=('', '_prev'))
+        df = df.loc[df['inspection_date'] > df['inspection_date_prev'], :]
+        df['time_since_prev'] = (df['inspection_date'] -
+                                 df['inspection_date_prev'])
+        g = df.sort_values(['camis', 'inspection_date', 'time_since_prev']
+                           ).groupby(['camis', 'inspection_date'])
+        df['rnk'] = g['time_since_prev'].rank(method='first')
+        # Notebook aligns group aggregates via a (camis, inspection_date)
+        # index; transform() gives the same result under current pandas.
+        g = df.groupby(['camis', 'inspection_date'])['score']
+        df['score_avg'] = g.transform('mean')
+        df['score_std'] = g.transform('std')
+        df['score_max'] = g.transform('max')
+        df['score_cnt'] = g.transform('count')
+        df = df.loc[df['rnk'] == 1, :]
+        df.drop('rnk', axis=1, inplace=True)
+        result = pd.merge(data, df[['camis', 'inspection_date', 'score',
+                                    'score_avg', 'score_std', 'score_max',
+                                    'score_cnt', 'time_since_prev']],
+                          how='left', on=['camis', 'inspection_date'],
+                          suffixes=('', '_prev'))
+        result['time_since_prev'] = result['time_since_prev'].dt.days/365
+        return result[history.HISTORY_COLUMNS]
+
+    base, expected = best_time(self_merge, repeat=1)
+    fast, result = best_time(history.history_features, data)
+    pd.testing.assert_frame_equal(expected, result, check_dtype=False,
+                                  rtol=1e-12)
+    report('history_features ({} inspections)'.format(len(data.index)),
+           base, fast)
+
+
+@benchmark
+def history_store ():
+    """Recomputing history features of all inspections for a new month vs.
+    appending the month to a feature_store.HistoryStore.
+    """
+    data = _unique_inspections()
+    month = data['inspection_date'].dt.to_period('M')
+    latest = month == month.max()
+    store = feature_store.HistoryStore()
+    for _, batch in data[~latest].groupby(month[~latest]):
+        store.append(batch)
+
+    base, expected = best_time(history.history_features, data)
+    copies = [copy.deepcopy(store) for _ in range(3)]
+    fast, result = best_time(lambda: copies.pop().append(data[latest]))
+    pd.testing.assert_frame_equal(expected[latest], result, rtol=1e-9)
+    report('history_store (append {0} of {1} inspections)'.format(
+           latest.sum(), len(data.index)), base, fast)
+
+
+def _name_pairs ():
+    """DBA of each inspection with the Yelp name of its restaurant."""
+    names = pd.read_csv(PATH_YELP_DATA, encoding='ISO-8859-1',
+                        usecols=['CAMIS', 'name'])
+    names = names.drop_duplicates('CAMIS')
+    dba = pd.read_csv(PATH_INSPECTIONS, usecols=['CAMIS', 'DBA'])
+    return pd.merge(dba, names, on='CAMIS')
+
+
+@benchmark
+def name_similarity ():
+    """Notebook's row-wise Levenshtein vs. similarity.pair_similarity(),
+    plus throughput of each metric over distinct pairs.
+    """
+    data = _name_pairs()
+    uncached = similarity.levenshtein.__wrapped__
+
+    def row_wise ():
+        return data.apply(lambda row: uncached(row['DBA'], row['name']),
+                          axis=1)
+
+    def batched (metric='levenshtein', workers=1):
+        for func in similarity.METRICS.values():
+            if hasattr(func, 'cache_clear'):
+                func.cache_clear()
+        return similarity.pair_similarity(data['DBA'], data['name'],
+                                          metric=metric, workers=workers)
+
+    base, expected = best_time(row_wise, repeat=1)
+    fast, result = best_time(batched)
+    pd.testing.assert_series_equal(expected.astype(float), result)
+    report('name_similarity ({} rows)'.format(len(data.index)), base, fast)
+
+    pairs = len(data[['DBA', 'name']].drop_duplicates().index)
+    for metric in similarity.METRICS:
+        for workers in [1, 4]:
+            seconds, _ = best_time(batched, metric, workers)
+            print('  {0:<18} workers={1}: {2:>9,.0f} distinct pairs/s'.format(
+                  metric, workers, pairs/seconds))
+
+
+@benchmark
+def match_verification ():
+    """Row-wise scoring of bridge pairs vs. match_quality.score_matches()."""
+    nyc_df = inspections.load_inspections()
+    yelp_df = pd.read_csv(PATH_YELP_DATA, encoding='ISO-8859-1')
+    bridge_df = yelp_df[['CAMIS', 'id']].rename(columns={'id':'YELP_ID'})
+    centroids = match_quality.zip_centroids(yelp_df)
+    weights = match_quality.WEIGHTS
+
+    def score_row (row):
+        checks = {
+            'name_sim':similarity.token_set_ratio.__wrapped__(
+                  str(row['DBA']), str(row['name'])),
+            'zip_match':float(int(row['ZIPCODE']) == int(row['zip_code'])),
+            }
+        if pd.notnull(row['FULL_ADDRESS']) and pd.notnull(row['address']):
+            checks['address_match'] = float(
+                  addresses.canonical_address(row['FULL_ADDRESS']) ==
+                  addresses.canonical_address(row['address']))
+        phones = [''.join(c for c in str(p).replace('.0', '') if c.isdigit())
+                  for p in (row['PHONE'], row['phone'])]
+        if all(len(p) >= 10 for p in phones):
+            checks['phone_match'] = float(phones[0][-10:] == phones[1][-10:])
+        center = centroids.loc[row['ZIPCODE']]
+        distance = match_quality.haversine_km(
+              center['latitude'], center['longitude'], row['latitude'],
+              row['longitude'])
+        checks['geo_score'] = min(max((match_quality.FAR_KM - distance)/
+                                      (match_quality.FAR_KM -
+                                       match_quality.NEAR_KM), 0), 1)
+        return (sum(weights[k]*v for k, v in checks.items())/
+                sum(weights[k] for k in checks))
+
+    def row_wise ():
+        restaurants = nyc_df.drop_duplicates('CAMIS')[
+              ['CAMIS', 'DBA', 'FULL_ADDRESS', 'ZIPCODE', 'PHONE']]
+        merged = pd.merge(bridge_df, restaurants, on='CAMIS')
+        merged = pd.merge(merged, yelp_df.drop('CAMIS', axis=1),
+                          left_on='YELP_ID', right_on='id')
+        return merged.apply(score_row, axis=1)
+
+    base, expected = best_time(row_wise, repeat=1)
+    fast, result = best_time(match_quality.score_matches, bridge_df, nyc_df,
+                             yelp_df)
+    assert np.allclose(np.sort(expected.to_numpy()),
+                       np.sort(result['confidence'].to_numpy()))
+    report('match_verification ({} pairs)'.format(len(result.index)),
+           base, fast)
+
+
+@benchmark
+def local_yelp_matching ():
+    """Querying the Yelp API (stub with 50ms latency) for every CAMIS vs.
+    matching against a yelp_index.YelpIndex of saved business JSON first.
+    Reports how many CAMIS of the current bridge the index resolves, and how
+    many of those to the same Yelp id.
+    """
+    yelp_df = pd.read_csv(PATH_YELP_DATA, encoding='ISO-8859-1')
+    businesses = [{'id':row.id, 'name':row.name,
+                   'location':{'address1':row.address,
+                               'zip_code':row.zip_code}}
+                  for row in yelp_df.itertuples()]
+    nyc_df = inspections.load_inspections().drop_duplicates('CAMIS')
+    nyc_df = nyc_df[nyc_df['CAMIS'].isin(yelp_df['CAMIS'])]
+    queries = list(zip(nyc_df['DBA'], nyc_df['FULL_ADDRESS'],
+                       nyc_df['ZIPCODE']))
+
+    index = yelp_index.YelpIndex(businesses)
+    matches = [index.match(*query) for query in queries]
+    bridge = dict(zip(yelp_df['CAMIS'], yelp_df['id']))
+    same = sum(biz is not None and biz['id'] == bridge[camis]
+               for biz, camis in zip(matches, nyc_df['CAMIS']))
+    print('  resolved locally: {0} of {1} CAMIS ({2} to the bridge\'s '
+          'Yelp id)'.format(sum(biz is not None for biz in matches),
+                            len(queries), same))
+
+    sample = queries[:400]
+    with stub_yelp_api(latency=0.05), yelp.YelpClient() as client:
+        base, _ = best_time(yelp.get_business_matches,
+                            [query[:2] for query in sample], client=client,
+                            repeat=1)
+        fast, _ = best_time(yelp_index.resolve_matches, sample, index,
+                            client=client, repeat=1)
+    report('resolve_matches ({} CAMIS)'.format(len(sample)), base, fast)
+
+
+@benchmark
+def bridge_blocks ():
+    """Cost of saving one more 1000-CAMIS block to a bridge of 30 blocks:
+    reloading, appending to and rewriting the bridge CSV (as update_yelp_data
+    did) vs. committing the block to a bridge_store.BridgeStore.
+    """
+    block_size, blocks = 1000, 30
+    pairs = [(40000000 + i, 'biz-{}'.format(i) if i % 7 else np.nan)
+             for i in range(block_size*(blocks + 1))]
+    candidates = pd.DataFrame({'CAMIS':[camis for camis, _ in pairs]})
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_url = os.path.join(tmp_dir, 'bridge.csv')
+        pd.DataFrame(pairs[:-block_size]).to_csv(csv_url, header=False,
+                                                 index=False)
+        store = bridge_store.BridgeStore(os.path.join(tmp_dir, 'bridge.db'))
+        store.add(pairs[:-block_size])
+        block = pairs[-block_size:]
+
+        def csv_block ():
+            bridge_df = pd.read_csv(csv_url, names=['CAMIS', 'YELP_ID'])
+            camis_done = bridge_df['CAMIS'].unique().tolist()
+            todo = candidates[~candidates['CAMIS'].isin(camis_done)]
+            bridge_df = pd.concat([bridge_df, pd.DataFrame(
+                  block, columns=['CAMIS', 'YELP_ID'])], ignore_index=True)
+            bridge_df.to_csv(csv_url + '.new', header=False, index=False)
+            return len(todo.index)
+
+        def store_block ():
+            todo = [camis for camis in candidates['CAMIS']
+                    if camis not in store]
+            store.add(block)
+            return len(todo)
+
+        base, expected = best_time(csv_block, repeat=1)
+        fast, result = best_time(store_block, repeat=1)
+        assert expected == result == block_size
+        assert len(store) == len(pairs)
+        store.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+    report('save bridge block ({} rows in bridge)'.format(
+           block_size*blocks), base, fast)
+
+
+def import_seconds (module, preload=('numpy', 'pandas', 'requests')):
+    """Seconds taken to import module in a fresh interpreter, after the
+    modules of preload are already imported.
+    """
+    code = ('import time\n'
+            'import {0}\n'
+            'start = time.perf_counter()\n'
+            'import {1}\n'
+            'print(time.perf_counter() - start)').format(', '.join(preload),
+                                                        module)
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.split()[-1])
+
+
+@benchmark
+def import_time ():
+    """Guards that importing the script modules doesn't load any data: each
+    must import within IMPORT_BUDGET on top of numpy, pandas and requests.
+    """
+    for module in ['data_prep', 'data_integrity']:
+        seconds = min(import_seconds(module) for _ in range(3))
+        print('  import {0}: {1:.1f}ms'.format(module, seconds*1000))
+        assert seconds < IMPORT_BUDGET, (
+              '{0} takes {1:.2f}s to import; does it load data at module '
+              'level?'.format(module, seconds))
+
+
+@benchmark
+def dataset_registry ():
+    """First vs. repeated access to each registered dataset with a file;
+    repeated access is served from memory until the file changes.
+    """
+    for name, dataset in datasets.DATASETS.items():
+        if dataset.signature()[0] is None:
+            continue
+        dataset.invalidate()
+        base, expected = best_time(datasets.load, name, repeat=1)
+        fast, result = best_time(datasets.load, name)
+        assert dataset.loads == 1 and result.equals(expected)
+        report('datasets.load({!r})'.format(name), base, fast)
+
+    # Touching a file invalidates its dataset.
+    dataset = datasets.get('model_data')
+    os.utime(dataset.path)
+    datasets.load('model_data')
+    assert dataset.loads == 2, 'model_data not reloaded after change'
+
+
+@benchmark
+def model_data_pipeline ():
+    """Cold vs. warm build of model data, and a rebuild after changing one
+    stage, which only reruns that stage and model_data.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        base, expected = best_time(model_data.build_model_data, tmp_dir,
+                                   repeat=1)
+        fast, result = best_time(model_data.build_model_data, tmp_dir)
+        assert result.equals(expected)
+        report('build model data (cached)', base, fast)
+
+        stages = [pipeline.Stage(stage.name, stage.func, stage.inputs,
+                                 version=stage.version + '-changed')
+                  if stage.name == 'dummies' else stage
+                  for stage in model_data.STAGES]
+        changed = pipeline.Pipeline(model_data.SOURCES, stages, tmp_dir,
+                                    model_data.log)
+        assert changed.stale() == ['dummies', 'model_data'], changed.stale()
+        fast, _ = best_time(changed.run, ['model_data'], repeat=1)
+        report('build model data (dummies changed)', base, fast)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+@benchmark
+def model_data_jobs ():
+    """Cold build of model data with stages run one at a time vs. on a
+    process pool (one process per CPU, at least 2). Feature stages after
+    base are independent, so they overlap on machines with several CPUs;
+    workers map base from the cache rather than decoding it, so the pool
+    costs little even on one or two CPUs.
+    """
+    jobs = max(2, os.cpu_count() or 1)
+    times, frames = [], []
+    for n in [1, jobs]:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            seconds, df = best_time(model_data.build_model_data, tmp_dir, n,
+                                    repeat=1)
+        finally:
+            shutil.rmtree(tmp_dir)
+        times.append(seconds)
+        frames.append(df)
+    assert frames[0].equals(frames[1]), 'parallel build differs'
+    report('build model data (jobs={}, {} CPUs)'.format(jobs, os.cpu_count()),
+           *times)
+
+
+@benchmark
+def pipeline_handoff ():
+    """Reading a stage's input in a worker: decoding it from Parquet (as the
+    pipeline cache used to be) vs. memory-mapping uncompressed Arrow.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        pipe = model_data.create_pipeline(tmp_dir)
+        df = pipe.run(['base'])['base']
+        parquet_path = os.path.join(tmp_dir, 'base.parquet')
+        arrow_path = os.path.join(tmp_dir, 'base.arrow')
+        frame_cache.write_frame(df, parquet_path)
+        pipeline.write_arrow(df, arrow_path)
+        base, expected = best_time(pd.read_parquet, parquet_path,
+                                   memory_map=True)
+        fast, result = best_time(pipeline.read_arrow, arrow_path)
+    finally:
+        shutil.rmtree(tmp_dir)
+    assert expected.equals(result), 'frames differ'
+    report('read base ({} rows)'.format(len(df.index)), base, fast)
+
+
+def _lasso_data ():
+    """Standardized training predictors and log score of 2016 inspections,
+    as prepared for the Lasso in the modeling notebook.
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    data = datasets.load('model_data')
+    # copy() consolidates the frame's many columns before adding more.
+    data = data.loc[data['inspection_year'] == 2016, :].copy().assign(
+          log_review_count=lambda df: np.log(df['review_count']),
+          sqrt_score_avg=lambda df: np.sqrt(df['score_avg']),
+          sqrt_score_prev=lambda df: np.sqrt(df['score_prev']))
+    cols = list(data.loc[:, 'review_count':'first_inspection'].columns)
+    cols = [c for c in cols if 'violation' not in c
+            and c not in ['review_count', 'score_avg', 'score_prev']]
+    cols += ['log_review_count', 'sqrt_score_avg', 'sqrt_score_prev']
+    train_df, _ = train_test_split(data[cols + ['log_score']], test_size=0.5,
+                                   random_state=87)
+    X = StandardScaler().fit_transform(train_df[cols].values)
+    return X, train_df['log_score'].values
+
+
+@benchmark
+def bootstrap_lasso ():
+    """Notebook's sequential bootstrap loop vs. bootstrap.bootstrap_lasso on
+    one process per CPU (at least 2), for 24 of the notebook's 500 resamples.
+    Fits are independent, so time scales down with the number of CPUs.
+    """
+    from sklearn.linear_model import LassoCV
+
+    X, y = _lasso_data()
+    nsims, workers = 24, max(2, os.cpu_count() or 1)
+
+    def notebook_loop ():
+        n, p = X.shape
+        coef = np.zeros((nsims, p))
+        for i in range(nsims):
+            sample = np.random.randint(0, n, n)
+            mod = LassoCV(cv=5, max_iter=100000)
+            mod.fit(X[sample], y[sample])
+            coef[i, :] = mod.coef_
+        return coef
+
+    base, _ = best_time(notebook_loop, repeat=1)
+    fast, (coef, intervals) = best_time(
+          bootstrap.bootstrap_lasso, X, y, nsims, seed=0, workers=workers,
+          repeat=1)
+    serial, _ = bootstrap.bootstrap_lasso(X, y, nsims, seed=0, workers=1)
+    assert np.array_equal(coef, serial), 'coefficients depend on workers'
+    assert coef.shape == (nsims, X.shape[1]) and len(intervals) == X.shape[1]
+    report('{0} bootstrap Lasso fits (workers={1}, {2} CPUs)'.format(
+           nsims, workers, os.cpu_count()), base, fast)
+
+
+def main (names):
+    for name in names or BENCHMARKS:
+        print('*** {}'.format(name))
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,157 @@
+"""
+Bootstrap
+---------
+Empirical confidence intervals of Lasso coefficients, as in the modeling
+notebook: LassoCV is refit on NSIMS bootstrap resamples of the training data
+and each coefficient's interval is given by quantiles of its fits.
+
+Resamples are fit on a pool of processes. X and y are copied once into
+shared memory, which workers map read-only instead of receiving a pickled
+copy per task. Each resample draws its rows from its own RNG stream, spawned
+from one seed, so the coefficients depend on the seed only, not on the
+number of workers or the order resamples finish in.
+
+    coef, intervals = bootstrap_lasso(X_train, y_train, names=names)
+    intervals[intervals['significant']]
+"""
+
+import concurrent.futures
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LassoCV
+from threadpoolctl import threadpool_limits
+
+NSIMS = 500
+
+# Each interval spans the ALPHA to 1 - ALPHA quantiles (95% by default).
+ALPHA = 0.025
+
+LASSO_PARAMS = {'cv':5, 'max_iter':100000}
+
+# Resamples are handed out in about this many chunks per worker, so workers
+# finishing early pick up remaining work.
+CHUNKS_PER_WORKER = 4
+
+# Arrays shared with the worker process: name -> (shared memory, array).
+_shared = {}
+
+
+def _share (name, array):
+    """Copies array into a new shared memory block; returns the block and a
+    description a worker attaches with (see _attach).
+    """
+    array = np.ascontiguousarray(array, dtype=np.float64)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    return shm, (name, shm.name, array.shape)
+
+
+def _attach (blocks):
+    """Worker initializer: maps shared blocks as read-only arrays. Limits
+    BLAS to one thread, as workers already use every CPU.
+    """
+    for name, shm_name, shape in blocks:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        array = np.ndarray(shape, np.float64, buffer=shm.buf)
+        array.flags.writeable = False
+        _shared[name] = (shm, array)
+    threadpool_limits(1)
+
+
+def _fit_resamples (seeds, lasso_params, X=None, y=None):
+    """Fits LassoCV to one bootstrap resample of X, y per seed.
+
+    Args:
+        seeds (List[np.random.SeedSequence]): Seed of each resample.
+        lasso_params (dict): Keyword arguments of LassoCV.
+        X, y (np.ndarray): Training data; the shared arrays if None.
+
+    Returns:
+        np.ndarray: Coefficients, one row per seed.
+    """
+    if X is None:
+        X, y = _shared['X'][1], _shared['y'][1]
+    n = X.shape[0]
+    coef = np.empty((len(seeds), X.shape[1]))
+    for i, seed in enumerate(seeds):
+        sample = np.random.default_rng(seed).integers(0, n, n)
+        mod = LassoCV(**lasso_params)
+        mod.fit(X[sample], y[sample])
+        coef[i, :] = mod.coef_
+    return coef
+
+
+def coefficient_intervals (coef, alpha=ALPHA, names=None):
+    """Mean and empirical quantile interval of each coefficient.
+
+    Args:
+        coef (np.ndarray): Bootstrap coefficients, one row per resample.
+        alpha (float): Lower quantile; the upper one is 1 - alpha.
+        names (List[str]): Predictor names, used as index.
+
+    Returns:
+        pd.DataFrame: coef, LB and UB columns and significant (whether the
+        interval excludes 0), one row per predictor.
+    """
+    intervals = pd.DataFrame({
+        'coef':coef.mean(axis=0),
+        'LB':np.quantile(coef, alpha, axis=0),
+        'UB':np.quantile(coef, 1 - alpha, axis=0),
+        }, index=names)
+    intervals['significant'] = (intervals['LB'] > 0) | (intervals['UB'] < 0)
+    return intervals
+
+
+def bootstrap_lasso (X, y, nsims=NSIMS, alpha=ALPHA, names=None, seed=None,
+                     workers=None, **lasso_params):
+    """Fits LassoCV to nsims bootstrap resamples of X, y on a process pool.
+
+    Args:
+        X (np.ndarray): Predictors, one row per observation.
+        y (np.ndarray): Response.
+        nsims (int): Number of resamples.
+        alpha (float): Lower quantile of intervals.
+        names (List[str]): Predictor names.
+        seed (int): Seed of the resamples; fresh entropy if None.
+        workers (int): Number of processes (default one per CPU); if 1,
+        resamples are fit in this process.
+        **lasso_params: Keyword arguments overriding LASSO_PARAMS.
+
+    Returns:
+        (np.ndarray, pd.DataFrame): Coefficients (nsims by predictors) and
+        their intervals (see coefficient_intervals).
+    """
+    params = dict(LASSO_PARAMS, **lasso_params)
+    seeds = np.random.SeedSequence(seed).spawn(nsims)
+    workers = min(workers or os.cpu_count() or 1, nsims)
+
+    if workers == 1:
+        coef = _fit_resamples(seeds, params, np.asarray(X, np.float64),
+                              np.asarray(y, np.float64))
+        return coef, coefficient_intervals(coef, alpha, names)
+
+    n_chunks = min(nsims, workers*CHUNKS_PER_WORKER)
+    bounds = np.linspace(0, nsims, n_chunks + 1).astype(int)
+    coef = np.empty((nsims, np.shape(X)[1]))
+    blocks = []
+    try:
+        for name, array in [('X', X), ('y', y)]:
+            blocks.append(_share(name, array))
+        with concurrent.futures.ProcessPoolExecutor(
+              workers, initializer=_attach,
+              initargs=([desc for _, desc in blocks],)) as pool:
+            futures = {pool.submit(_fit_resamples, seeds[start:stop],
+                                   params): start
+                       for start, stop in zip(bounds[:-1], bounds[1:])}
+            for future in concurrent.futures.as_completed(futures):
+                block = future.result()
+                start = futures[future]
+                coef[start:start + len(block), :] = block
+    finally:
+        for shm, _ in blocks:
+            shm.close()
+            shm.unlink()
+    return coef, coefficient_intervals(coef, alpha, names)
@@ -0,0 +1,158 @@
+"""
+Bridge Store
+------------
+The CAMIS/Yelp ID bridge built by data_prep.update_yelp_data, kept in a
+SQLite database instead of inspection_yelp_bridge.csv.
+
+Each block of matches is committed in one transaction, so a crash leaves the
+bridge as of the last finished block instead of a half-written CSV, and a
+block costs time proportional to its size rather than to the whole bridge.
+The CAMIS already in the bridge are also held in a set, for O(1) "is this
+CAMIS done?" checks.
+"""
+
+import os
+import sqlite3
+
+import pandas as pd
+
+from paths import DATA_DIR
+
+PATH_BRIDGE = os.path.join(DATA_DIR, 'inspection_yelp_bridge.sqlite')
+PATH_BRIDGE_CSV = os.path.join(DATA_DIR, 'inspection_yelp_bridge.csv')
+
+
+class BridgeStore:
+    """CAMIS/Yelp ID pairs in insertion order, one per CAMIS. A CAMIS without
+    a Yelp match has YELP_ID None, so it isn't queried again.
+    """
+
+    def __init__ (self, path=PATH_BRIDGE):
+        """
+        Args:
+            path (str): SQLite database file; ':memory:' for a temporary store.
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        # Write-ahead log: commits are atomic and durable without blocking
+        # readers.
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._conn:
+            self._conn.execute(
+                  'CREATE TABLE IF NOT EXISTS bridge (seq INTEGER PRIMARY KEY '
+                  'AUTOINCREMENT, camis INTEGER NOT NULL UNIQUE, '
+                  'yelp_id TEXT)')
+        self._camis = {row[0] for row in
+                       self._conn.execute('SELECT camis FROM bridge')}
+
+    def __contains__ (self, camis):
+        return int(camis) in self._camis
+
+    def __len__ (self):
+        return len(self._camis)
+
+    def add (self, pairs):
+        """Saves block of (CAMIS, YELP_ID) pairs in one transaction; NaN
+        YELP_IDs are saved as None. A CAMIS already in the store keeps its
+        first YELP_ID.
+
+        Returns:
+            int: Number of new CAMIS.
+        """
+        rows = [(int(camis), yelp_id if pd.notna(yelp_id) else None)
+                for camis, yelp_id in pairs]
+        with self._conn:  # commits, or rolls back on error
+            before = self._conn.total_changes
+            self._conn.executemany(
+                  'INSERT OR IGNORE INTO bridge (camis, yelp_id) '
+                  'VALUES (?, ?)', rows)
+            added = self._conn.total_changes - before
+        self._camis.update(camis for camis, _ in rows)
+        return added
+
+    def to_frame (self):
+        """Returns bridge DF like load_inspections_yelp_bridge(): CAMIS and
+        YELP_ID columns, indexed by CAMIS.
+        """
+        df = pd.read_sql_query(
+              'SELECT camis AS CAMIS, yelp_id AS YELP_ID FROM bridge '
+              'ORDER BY seq', self._conn)
+        df.set_index('CAMIS', inplace=True, drop=False)
+        return df
+
+    def export_csv (self, url=PATH_BRIDGE_CSV):
+        """Writes bridge to CSV in the format update_yelp_data used to write
+        (see read_bridge_csv), atomically.
+        """
+        tmp_url = url + '.tmp'
+        self.to_frame().reset_index(drop=True).to_csv(tmp_url,
+                                                      encoding='ISO-8859-1')
+        os.replace(tmp_url, url)
+
+    def close (self):
+        self._conn.close()
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, *exc):
+        self.close()
+
+
+def read_bridge_csv (url=PATH_BRIDGE_CSV):
+    """Reads CSV bridge in either layout used before the store: headerless
+    CAMIS, YELP_ID rows (as load_inspections_yelp_bridge read it), or as
+    update_yelp_data wrote it (DataFrame.to_csv() defaults: a header row and
+    an unnamed index column).
+
+    Returns:
+        pd.DataFrame: CAMIS (int) and YELP_ID (str, NaN if no match)
+        columns.
+    """
+    with open(url, encoding='ISO-8859-1') as f:
+        first_line = f.readline()
+    has_header = 'CAMIS' in first_line.strip().split(',')
+    df = pd.read_csv(url, header=0 if has_header else None,
+                     names=None if has_header else ['CAMIS', 'YELP_ID'],
+                     encoding='ISO-8859-1',
+                     dtype={'CAMIS':'int64', 'YELP_ID':object})
+    return df[['CAMIS', 'YELP_ID']]
+
+
+def read_bridge (path=PATH_BRIDGE, csv_url=PATH_BRIDGE_CSV):
+    """Reads bridge DF (as BridgeStore.to_frame()) from store at path, or
+    from the CSV bridge at csv_url while there is no store yet. Unlike
+    open_bridge_store, never creates the store.
+    """
+    if not os.path.exists(path):
+        df = read_bridge_csv(csv_url)
+        df.set_index('CAMIS', inplace=True, drop=False)
+        return df
+    with BridgeStore(path) as store:
+        return store.to_frame()
+
+
+def open_bridge_store (path=PATH_BRIDGE, csv_url=PATH_BRIDGE_CSV):
+    """Opens bridge store at path. A new store is first filled from the CSV
+    bridge at csv_url, if there is one.
+
+    The store is seeded under a temporary name and moved into place once
+    complete, so a failed seed doesn't leave behind an empty store that
+    would be taken as seeded the next time.
+    """
+    if not os.path.exists(path) and os.path.exists(csv_url):
+        df = read_bridge_csv(csv_url)
+        tmp_path = path + '.tmp'
+        try:
+            for stale in [tmp_path, tmp_path + '-wal', tmp_path + '-shm']:
+                if os.path.exists(stale):
+                    os.remove(stale)
+            with BridgeStore(tmp_path) as seed:
+                seed.add(zip(df['CAMIS'], df['YELP_ID']))
+            # Closing the last connection checkpoints the write-ahead log
+            # into the database file, which is then complete on its own.
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return BridgeStore(path)
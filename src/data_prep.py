@@ -10,38 +10,38 @@ Assumptions that were made:
 """
 
 
+import argparse
 import getpass
 import json
+import os
 
 import numpy as np
 import pandas as pd
 
+from addresses import (clean_street_address, create_full_address,
+                       create_full_address_old)
+from bridge_store import open_bridge_store, read_bridge
+import datasets
+import inspections
+import match_quality
 from timer import ProgramTimer
 import yelp
+from yelp_data import (PATH_YELP_JSON, create_yelp_data_df, iter_yelp_data,
+                       load_yelp_data)
+from yelp_index import YelpIndex, resolve_matches
 pd.options.mode.chained_assignment = None
 log = ProgramTimer(ud_start=True, ud_end=False)
 log._start_ud_pre_txt = ''
 
 #####################################################################
-# Paths to key datasets.
+# Paths to key datasets (see datasets).
 
-PATH_YELP_DATA = '../data/yelp_data.csv'
-PATH_INSPECTIONS = '../data/nyc_restaurant_inspection_data.csv'
+PATH_YELP_DATA = datasets.PATH_YELP_DATA
+PATH_INSPECTIONS = datasets.PATH_INSPECTIONS
 
 #####################################################################
 # Reading / writing JSON and Excel.
 
-def load_yelp_data (url):
-    """Loads Yelp data saved on local computer at given url."""
-    data = []
-    decoder = json.JSONDecoder()
-    with open(url, 'r', encoding='utf-8') as src:
-        for line in src:
-            obj, idx = decoder.raw_decode(line)
-            data.append(obj)
-    return data
-
-
 def append_json_to_file (data, url):
     """Appends JSON to existing .txt file."""
     with open(url, 'a+', encoding='utf-8') as f:
@@ -66,52 +66,48 @@ def write_json_to_file (data, url):
 #####################################################################
 # Functions used to load / add new fields to NYC inspection results DataFrame.
 
-def clean_street_address (address):
-    """Remove redundant spaces in STREET column."""
-    try:
-        return ' '.join(address.split())
-    except:
-        return address
-
+def load_inspection_data (url=None, use_cache=True):
+    """Creates DF from NYC inspections data and handles preliminary
+    data-cleaning. See inspections.load_inspections().
 
-def create_full_address_old (row):
-    """Create location search term used for Yelp API by combining fields.
-    Was used to build address used as the location search term for Yelp API.
+    Args:
+        url (str): Path of inspections CSV; if None, the registered
+        inspections dataset, memoized by datasets.
+        use_cache (bool): If False, always parses and cleans the CSV.
     """
-    if row['BUILDING'] == 'NKA':
-        return '{0}, {1}'.format(row['STREET'], row['ZIPCODE'])
-    return '{0} {1}, {2}'.format(row['BUILDING'], row['STREET'], row['ZIPCODE'])
+    if url is None and use_cache:
+        return datasets.load('inspections')
+    return inspections.load_inspections(url or PATH_INSPECTIONS, use_cache)
 
 
-def create_full_address (row):
-    """Create representation of address in same format as the address field
-    from Yelp's API.
+def load_inspections_yelp_bridge (url=None):
+    """Loads CAMIS/Yelp ID bridge DF (indexed by CAMIS) from bridge store at
+    url (see bridge_store.read_bridge); if None, the registered bridge
+    dataset, memoized by datasets.
     """
-    if row['BUILDING'] == 'NKA':
-        return row['STREET']
-    return '{0} {1}'.format(row['BUILDING'], row['STREET'])
+    if url is None:
+        return datasets.load('bridge')
+    return read_bridge(url)
 
 
-def load_inspection_data (url=PATH_INSPECTIONS):
-    """Creates DF from NYC inspections data and handles preliminary
-    data-cleaning.
-    """
-    df = pd.read_csv(url)
-    # Remove records not containing a zip code and ensure zip code is an int.
-    df = df[df['ZIPCODE'].notnull()]
-    df['ZIPCODE'] = df['ZIPCODE'].astype(np.int64)
-    # Format street address.
-    df['STREET'] = df['STREET'].apply(clean_street_address)
-    # Create full address used for Yelp API.
-    df['FULL_ADDRESS'] = df.apply(create_full_address, axis=1)
-    df['YELP_ID'] = np.NaN  # will be added later.
-    return df
+def index_bridge_by_yelp_id (bridge_df):
+    """Creates hash index from YELP_ID to CAMIS out of bridge DF.
 
+    When a YELP_ID was matched to several CAMIS, the first bridge row wins and
+    the duplicates are logged as errors.
 
-def load_inspections_yelp_bridge (url='inspection_yelp_bridge.csv'):
-    df = pd.read_csv(url, names=['CAMIS', 'YELP_ID'], encoding='ISO-8859-1')
-    df.set_index('CAMIS', inplace=True, drop=False)
-    return df
+    Returns:
+        pd.Series: CAMIS indexed by (unique) YELP_ID.
+    """
+    bridge_df = bridge_df[bridge_df['YELP_ID'].notnull()]
+    dupes = bridge_df[bridge_df.duplicated('YELP_ID', keep=False)]
+    for yelp_id, camis in dupes.groupby('YELP_ID', sort=False)['CAMIS']:
+        log.log_err('index_bridge_by_yelp_id', yelp_id,
+                    'YELP_ID matched to CAMIS {}'.format(camis.tolist()))
+    bridge_df = bridge_df.drop_duplicates('YELP_ID')
+    return pd.Series(bridge_df['CAMIS'].values,
+                     index=pd.Index(bridge_df['YELP_ID'].values, name='YELP_ID'),
+                     name='CAMIS')
 
 
 #####################################################################
@@ -120,195 +116,189 @@ def load_inspections_yelp_bridge (url='inspection_yelp_bridge.csv'):
 #   (2) DataFrame containing CAMIS (from NYC inspections data) and id from
 #       Yelp business queries in order to pair the two datasets.
 
-def update_yelp_data (row_count, inspections_df=None):
-    """Saves row_count number of Yelp business JSON entries to existing
-    datasets.
+def _encodable_business_id (camis, biz_json):
+    """Returns id of business JSON, or NaN if there was no match or the id
+    can't be encoded in the final csv.
     """
-    if not inspections_df:
-        inspections_df = load_inspection_data(PATH_INSPECTIONS)
+    if biz_json is None:
+        return np.nan
 
-    new_biz_json = []
+    # Ensure the business id will be able to be encoded in final csv.
+    # If not, we can't use it.
+    try:
+        biz_json['id'].encode('ISO-8859-1')
+    except:
+        print('Failed encoding business id for CAMIS: {}'.format(camis))
+        return np.nan
 
-    def find_business_id (row):
-        """Queries Yelp API for id of best-matching JSON business response.
+    return biz_json['id']
 
-        ALSO adds the business JSON to module-level list for eventual saving.
-        """
-        nonlocal new_biz_json
-        search_term = row['DBA']  # business name
-        location = row['FULL_ADDRESS']
-        biz_json = yelp.get_business_match(search_term, location)
 
-        if biz_json is None:
-            return np.NaN
+def open_yelp_client ():
+    """Returns a rate-limited YelpClient with its own connection to the
+    response cache, which counts hits and misses on log (the shared client's
+    cache is left as is).
+    """
+    return yelp.YelpClient(rate_limiter=yelp.get_rate_limiter(),
+                           cache=yelp.ResponseCache(timer=log))
 
-        # Ensure the business id will be able to be encoded in final csv.
-        # If not, we can't use it.
-        try:
-            biz_id = biz_json['id'].encode('ISO-8859-1')
-        except:
-            print('Failed encoding business id for CAMIS: {}'.format(
-                  row['CAMIS']))
-            return np.NaN
 
-        # Append this JSON to full list.
-        new_biz_json.append(biz_json)
+def load_yelp_index (url=PATH_YELP_JSON):
+    """Builds local index of the Yelp business JSON saved at url (empty if
+    there is no such file yet).
+    """
+    if not os.path.exists(url):
+        return YelpIndex()
+    return YelpIndex(iter_yelp_data(url))
+
+
+def update_yelp_data (row_count, inspections_df=None,
+                      workers=yelp.MAX_WORKERS, index=None, store=None,
+                      client=None, json_url=PATH_YELP_JSON):
+    """Saves row_count number of Yelp business JSON entries to existing
+    datasets. Returns the number of CAMIS that were looked up.
 
-        return biz_json['id']
+    CAMIS are first matched against Yelp JSON already saved (see yelp_index);
+    only the rest are queried from the Yelp API.
 
+    Args:
+        row_count (int): Number of CAMIS to match.
+        inspections_df (pd.DataFrame): NYC inspections data; loaded if None.
+        workers (int): Number of concurrent Yelp API requests.
+        index (YelpIndex): Index of saved Yelp JSON, updated with new JSON;
+        built from json_url if None.
+        store (BridgeStore): CAMIS/Yelp ID bridge, which the block is
+        committed to; opened (see bridge_store) and closed again if None.
+        client (yelp.YelpClient): Connection to the API; one is opened for
+        the block (see open_yelp_client) if None.
+        json_url (str): File the block's new Yelp business JSON is appended
+        to.
+    """
+    if inspections_df is None:
+        inspections_df = load_inspection_data()
+    if index is None:
+        index = load_yelp_index(json_url)
+    if store is not None:
+        return _update_yelp_block(row_count, inspections_df, workers, index,
+                                  store, client, json_url)
+    with open_bridge_store() as store:
+        return _update_yelp_block(row_count, inspections_df, workers, index,
+                                  store, client, json_url)
+
+
+def _update_yelp_block (row_count, inspections_df, workers, index, store,
+                        client, json_url):
+    """Body of update_yelp_data, once its defaults are resolved."""
     log.start('Loading NYC Inspections data with no corresponding Yelp id')
 
-    # Load NYC inspections data and Yelp-inspections bridge.
-    # Filter inspections data to only those (unique) records for which a Yelp ID
-    # has not been recovered
-    bridge_df = load_inspections_yelp_bridge('inspection_yelp_bridge.csv')
-    camis_done = bridge_df['CAMIS'].unique().tolist()
-    inspections_df = inspections_df[~inspections_df['CAMIS'].isin(camis_done)]
     # Preserve only rows with unique CAMIS since right now we only care about
-    # finding business details per CAMIS.
-    inspections_df.drop_duplicates('CAMIS', inplace=True)
+    # finding business details per CAMIS, and filter those to records for
+    # which a Yelp ID hasn't been looked for yet.
+    inspections_df = inspections_df.drop_duplicates('CAMIS')
+    not_done = [camis not in store for camis in inspections_df['CAMIS']]
+    inspections_df = inspections_df[not_done]
 
     # Work on only a subset of NYC inspections (to avoid breaching Yelp API
     # daily limits).
     inspections_subset = inspections_df.iloc[:row_count]
     log.end()
 
-    log.start('Querying Yelp API for business id per CAMIS')
-    # find_business_id() function adds Yelp business JSON entry to business_json
-    # list during the process of obtaining the id for the business.
-    inspections_subset['YELP_ID'] = inspections_subset.apply(find_business_id,
-                                                             axis=1)
+    log.start('Matching business id per CAMIS (saved Yelp data, then API)')
+    # Business JSON is returned in the same order as the queries, so the
+    # bridge rows and the JSON appended to file follow inspections order.
+    queries = zip(inspections_subset['DBA'],
+                  inspections_subset['FULL_ADDRESS'],
+                  inspections_subset['ZIPCODE'])
+    block_client = open_yelp_client() if client is None else None
+    try:
+        matches, local = resolve_matches(queries, index, workers=workers,
+                                         client=client or block_client)
+    finally:
+        if block_client is not None:
+            block_client.close()
+            block_client.cache.close()
+    log.increment('CAMIS matched locally', sum(local))
+    log.increment('CAMIS queried from Yelp API', len(local) - sum(local))
+    yelp_ids = [_encodable_business_id(camis, biz_json) for camis, biz_json
+                in zip(inspections_subset['CAMIS'], matches)]
+    inspections_subset['YELP_ID'] = yelp_ids
+    # Only JSON from the API is new; local matches are already saved.
+    new_biz_json = [biz_json for biz_id, biz_json, is_local
+                    in zip(yelp_ids, matches, local)
+                    if pd.notna(biz_id) and not is_local]
+    index.add(new_biz_json)
+    log.end()
+
+    # JSON is saved before the bridge marks its CAMIS as done.
+    log.start('Appending new Yelp business JSON to file')
+    append_json_to_file(new_biz_json, json_url)
     log.end()
 
-    # Create DataFrame of just CAMIS and Yelp ID to save.
+    # Commit the block's CAMIS and Yelp IDs to the bridge in one transaction.
     log.start('Saving updated CAMIS/Yelp ID bridge')
-    additional_bridge_data = inspections_subset[['CAMIS', 'YELP_ID']]
-    additional_bridge_data.set_index('CAMIS', inplace=True, drop=False)
-    # Append these new rows to existing bridge DF.
-    bridge_df = bridge_df.append(additional_bridge_data, ignore_index=True)
     try:
-        bridge_df.to_csv('inspection_yelp_bridge.csv', encoding='ISO-8859-1')
+        store.add(zip(inspections_subset['CAMIS'],
+                      inspections_subset['YELP_ID']))
     except Exception as e:
-        print('DF that caused error:')
-        print(additional_bridge_data)
+        print('Block that caused error:')
+        print(inspections_subset[['CAMIS', 'YELP_ID']])
         raise
     finally:
         log.end()
 
-    log.start('Appending new Yelp business JSON to file')
-    append_json_to_file(new_biz_json, 'yelp_data.txt')
-    log.end()
-
     log.print_summary('Finished')
+    return len(inspections_subset.index)
 
 
-def query_additional_yelp_business_json (blocks, queries_per_block):
+def query_additional_yelp_business_json (blocks=None, queries_per_block=1000,
+                                         workers=yelp.MAX_WORKERS):
     """Query Yelp API for business data in chunks in order to save
     intermittently.
-    """
-    inspections_df = load_inspection_data(PATH_INSPECTIONS)
-    for block in range(0, blocks):
-        print('Executing block {}\n'.format(block + 1))
-        update_yelp_data(queries_per_block, inspections_df)
-
-
-#####################################################################
-# Creating a DataFrame out of the Yelp business JSON data.
 
-def _get_categories (row):
-    """Returns list of aliases from categories entry."""
-    result = []
-    try:
-        for category in row['categories']:
-            result.append(category['alias'])
-    except:
-        log.log_err('_get_categories', row['id'])
-        return np.NaN
-    if not result:
-        return np.NaN
-    return result
-
-
-def _get_transactions (row):
-    transactions = row['transactions']
-    if not transactions:
-        return np.NaN
-    return transactions
-
-
-def _get_item (row, fld):
-    """Encapsulate retrieving item from JSON so that an NaN can be returned
-    when that field is not present.
+    Requests are paced by yelp's rate limiter, and each block is sized to
+    fit in what is left of the daily quota. If blocks is None, keeps going
+    until every CAMIS has been queried or the daily quota is used up.
     """
+    inspections_df = load_inspection_data()
+    index = load_yelp_index()
+    store = open_bridge_store()
+    client = open_yelp_client()
+    limiter = client.rate_limiter
+    block = 0
     try:
-        return row[fld]
-    except KeyError:
-        log.log_err('_get_item', row['id'], fld)
-        return np.NaN
+        while blocks is None or block < blocks:
+            row_count = min(queries_per_block, limiter.remaining_today)
+            if row_count == 0:
+                print('Daily Yelp API quota used up.\n')
+                break
+            block += 1
+            print('Executing block {}\n'.format(block))
+            if update_yelp_data(row_count, inspections_df, workers, index,
+                                store, client) == 0:
+                break
+    finally:
+        client.close()
+        client.cache.close()
+        store.close()
 
 
-def _get_price (row):
-    try:
-        return row['price'].count('$')
-    except KeyError:
-        log.log_err('_get_price', row['id'], 'price')
+#####################################################################
+# Loading the Yelp business DataFrame (see yelp_data for how it is created).
 
+def load_yelp_df (url=PATH_YELP_DATA, bridge_df=None):
+    """Loads DF of Yelp business data with CAMIS (from bridge) as index.
 
-def _get_coord (row, coord):
-    try:
-        return float(row['coordinates'][coord])
-    except:
-        log.log_err('_get_coord', row['id'], coord)
-        return np.NaN
-
-
-def _create_df_entry_from_json (row):
-    """Creates row to be appended onto DataFrame."""
-    new_row = {'id':row['id'],
-               'name':row['name'],
-               'url':_get_item(row, 'url'),
-               'phone':_get_item(row, 'phone'),
-               'latitude':_get_coord(row, 'latitude'),
-               'longitude':_get_coord(row, 'longitude'),
-               'review_count':int(row['review_count']),
-               'price':_get_price(row),
-               'rating':float(row['rating']),
-               'transactions':_get_transactions(row),
-               'categories':_get_categories(row),
-               'address':row['location']['address1'],
-               'city':row['location']['city'],
-               'state':row['location']['state'],
-               'zip_code':row['location']['zip_code']
-               }
-    return new_row
-
-
-def create_yelp_data_df ():
-    """Saves DataFrame made out of Yelp business JSON and error log."""
-    df = pd.DataFrame(
-          columns=['id', 'name', 'url', 'phone', 'latitude', 'longitude',
-                   'review_count', 'price', 'rating', 'transactions',
-                   'categories', 'address', 'city', 'state', 'zip_code'])
-
-    json_data = load_yelp_data('yelp_data.txt')
-
-    for row in json_data:
-        new_row = _create_df_entry_from_json(row)
-        try:
-            name_decoded = new_row['name'].encode('ISO-8859-1')
-            id_decoded = new_row['id'].encode('ISO-8859-1')
-        except:
-            log.log_err('Creating row', 'na', 'name or id not encodable.')
-            continue
-        df = df.append(new_row, ignore_index=True)
-
-    df.set_index('id', inplace=True, drop=True)
-    df.to_csv('yelp_data.csv', encoding='ISO-8859-1')
-    log.errors.to_csv('error_log.csv')
-
-def load_yelp_df (url='yelp_data.csv'):
+    Raises:
+        KeyError if a Yelp id isn't in the bridge.
+    """
+    if bridge_df is None:
+        bridge_df = load_inspections_yelp_bridge()
     df = pd.read_csv(url, encoding='ISO-8859-1')
-    df['CAMIS'] = df.apply(get_camis, axis=1)
+    df['CAMIS'] = df['id'].map(index_bridge_by_yelp_id(bridge_df))
+    missing = df.loc[df['CAMIS'].isnull(), 'id']
+    if not missing.empty:
+        raise KeyError('Yelp ids not in bridge: {}'.format(missing.tolist()))
+    df['CAMIS'] = df['CAMIS'].astype(bridge_df['CAMIS'].dtype)
     df.set_index('CAMIS', inplace=True, drop=False)
     return df
 
@@ -316,38 +306,94 @@ def load_yelp_df (url='yelp_data.csv'):
 # Double-checking match between NYC Inspections and Yelp address to ensure
 # the business match is correct.
 
-# Filter NYC Inspections to rows with unique CAMIS for which there is a
-# YELP_ID in bridge table.
-nyc_df = load_inspection_data()
-bridge_df = load_inspections_yelp_bridge()
-camis_in_bridge = bridge_df['CAMIS'].unique().tolist()
-print('unique CAMIS count: {}'.format(len(camis_in_bridge)))
-
-nyc_df = nyc_df[nyc_df['CAMIS'].isin(camis_in_bridge)]
-print('Rows in NYC DF after limiting to Yelp universe: {}\n'.format(len(
-      nyc_df.index)))
-
-nyc_df.drop_duplicates('CAMIS', inplace=True)
-nyc_df.set_index('CAMIS', inplace=True, drop=False)
+def check_yelp_matches (weights=match_quality.WEIGHTS):
+    """Joins NYC inspections (one row per CAMIS in the bridge) to Yelp data,
+    printing row counts along the way, and saves bridge pairs that are
+    unlikely to be the same restaurant to yelp_match_rejects.csv.
 
-print('Rows in NYC DF after removing dupes: {}\n'.format(len(
-      nyc_df.index)))
-
-
-# Load Yelp data, append CAMIS from Inspections data, and set index to CAMIS.
-def get_camis (yelp_row):
-    row_match = bridge_df[bridge_df['YELP_ID'] == yelp_row['id']].iloc[0]
-    return row_match['CAMIS']
+    Args:
+        weights (Dict[str, float]): Weight of each check in a pair's
+        confidence (see match_quality.score_matches).
 
+    Returns:
+        pd.DataFrame: Joint DF.
+    """
+    # Filter NYC Inspections to rows with unique CAMIS for which there is a
+    # YELP_ID in bridge table.
+    nyc_df = load_inspection_data()
+    bridge_df = load_inspections_yelp_bridge()
+    camis_in_bridge = bridge_df['CAMIS'].unique().tolist()
+    print('unique CAMIS count: {}'.format(len(camis_in_bridge)))
+
+    nyc_df = nyc_df[nyc_df['CAMIS'].isin(camis_in_bridge)]
+    print('Rows in NYC DF after limiting to Yelp universe: {}\n'.format(len(
+          nyc_df.index)))
+
+    nyc_df.drop_duplicates('CAMIS', inplace=True)
+    nyc_df.set_index('CAMIS', inplace=True, drop=False)
+
+    print('Rows in NYC DF after removing dupes: {}\n'.format(len(
+          nyc_df.index)))
+
+    # Load Yelp data, append CAMIS from Inspections data, and set index to
+    # CAMIS.
+    yelp_df = load_yelp_df(bridge_df=bridge_df)
+    yelp_df.to_csv('yelp_data v2.csv', encoding='ISO-8859-1')
+
+    print('Rows in Yelp DF: {}'.format(len(yelp_df.index)))
+    print('Rows in Inspections DF: {}\n'.format(len(nyc_df.index)))
+
+    print('Columns in Yelp DF: {}\n'.format(yelp_df.columns))
+    print('Columns in Inspections DF: {}\n'.format(nyc_df.columns))
+
+    # Both DFs have CAMIS as index and column; merge on the column only.
+    merged_df = pd.merge(nyc_df.reset_index(drop=True),
+                         yelp_df.reset_index(drop=True), on='CAMIS')
+    print('Rows in joint DF: {}'.format(len(merged_df.index)))
+
+    # Score every bridge pair and save those unlikely to be the same
+    # restaurant.
+    match_scores = match_quality.score_matches(bridge_df, nyc_df, yelp_df,
+                                               weights)
+    rejects = match_quality.reject_list(match_scores, weights=weights)
+    print('Bridge pairs rejected: {0} of {1}'.format(len(rejects.index),
+                                                     len(match_scores.index)))
+    rejects.to_csv('yelp_match_rejects.csv', encoding='ISO-8859-1',
+                   index=False)
+    return merged_df
 
-yelp_df = load_yelp_df()
-yelp_df.to_csv('yelp_data v2.csv', encoding='ISO-8859-1')
 
-print('Rows in Yelp DF: {}'.format(len(yelp_df.index)))
-print('Rows in Inspections DF: {}\n'.format(len(nyc_df.index)))
+#####################################################################
+# Command line.
 
-print('Columns in Yelp DF: {}\n'.format(yelp_df.columns))
-print('Columns in Inspections DF: {}\n'.format(nyc_df.columns))
+def main (argv=None):
+    """Runs one of the data preparation steps:
 
-merged_df = pd.merge(nyc_df, yelp_df, on='CAMIS')
-print('Rows in joint DF: {}'.format(len(merged_df.index)))
\ No newline at end of file
+        python data_prep.py query [--blocks N] [--queries-per-block N]
+                                  [--workers N]
+        python data_prep.py yelp-df
+        python data_prep.py check
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+    query = commands.add_parser(
+          'query', help='Match more CAMIS to Yelp businesses.')
+    query.add_argument('--blocks', type=int, default=None)
+    query.add_argument('--queries-per-block', type=int, default=1000)
+    query.add_argument('--workers', type=int, default=yelp.MAX_WORKERS)
+    commands.add_parser('yelp-df', help='Build yelp_data.csv from JSON.')
+    commands.add_parser('check', help='Verify CAMIS/Yelp matches.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'query':
+        query_additional_yelp_business_json(args.blocks,
+                                            args.queries_per_block,
+                                            args.workers)
+    elif args.command == 'yelp-df':
+        create_yelp_data_df()
+    else:
+        check_yelp_matches()
+
+
+if __name__ == '__main__':
+    main()
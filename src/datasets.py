@@ -0,0 +1,166 @@
+"""
+Datasets
+--------
+Registry of the project's datasets, so paths are resolved in one place and
+each dataset is parsed once per session however many scripts or notebook
+cells ask for it.
+
+    import datasets
+    nyc_df = datasets.load('inspections')
+
+A dataset is loaded on first access and memoized in-process; it is reloaded
+when its file's modification time or size changes. Callers modifying their
+frame (e.g. set_index(inplace=True)) don't change the memoized one: frames
+are handed out as shallow copies, which behave like independent copies under
+pandas' copy-on-write (always on from pandas 3), or as deep copies when
+copy-on-write is off.
+"""
+
+import os
+import threading
+
+import pandas as pd
+
+from bridge_store import PATH_BRIDGE, PATH_BRIDGE_CSV, read_bridge
+import inspections
+from paths import DATA_DIR
+
+PATH_INSPECTIONS = inspections.PATH_INSPECTIONS
+PATH_YELP_DATA = os.path.join(DATA_DIR, 'yelp_data.csv')
+PATH_DEMOGRAPHICS = os.path.join(DATA_DIR, 'demographics_zipcode.csv')
+PATH_MODEL_DATA = os.path.join(DATA_DIR, 'model_data.csv')
+# Same store data_prep writes to (see bridge_store.open_bridge_store).
+PATH_BRIDGE_STORE = PATH_BRIDGE
+
+
+def _copy_on_write ():
+    """Whether pandas' copy-on-write is on."""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return pd.options.mode.copy_on_write is True
+
+
+def _file_signature (path):
+    """(mtime, size) of file at path, or None if there is none."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Dataset:
+    """Dataset built by a loader from a file, memoized until the file (or one
+    of its companion files) changes.
+    """
+
+    def __init__ (self, name, path, loader, companions=()):
+        """
+        Args:
+            name (str): Name of the dataset.
+            path (str): Path of the file it's loaded from.
+            loader (Callable[[str], pd.DataFrame]): Loads dataset from path.
+            companions (List[str]): Other files whose changes invalidate the
+            dataset (e.g. a SQLite write-ahead log, or a legacy file the
+            loader falls back to while there is no file at path).
+        """
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.companions = list(companions)
+        self.loads = 0
+        self._signature = None
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def signature (self):
+        return tuple(_file_signature(path)
+                     for path in [self.path] + self.companions)
+
+    def load (self):
+        """Returns dataset, loading it if not loaded yet or if its file has
+        changed since.
+        """
+        with self._lock:
+            signature = self.signature()
+            if all(sig is None for sig in signature):
+                raise FileNotFoundError('Dataset {0} not found at {1}.'.format(
+                      self.name, self.path))
+            if self._frame is None or signature != self._signature:
+                self._frame = self.loader(self.path)
+                self._signature = signature
+                self.loads += 1
+            return self._frame.copy(deep=not _copy_on_write())
+
+    def invalidate (self):
+        """Drops memoized frame, so the next load() reads the file again."""
+        with self._lock:
+            self._frame = None
+            self._signature = None
+
+
+#####################################################################
+# Loaders.
+
+def _load_yelp (path):
+    """Yelp business data with CAMIS as index."""
+    df = pd.read_csv(path, encoding='ISO-8859-1')
+    df.set_index('CAMIS', inplace=True, drop=False)
+    return df
+
+
+def _load_bridge (path):
+    """Bridge from store at path, or from the legacy CSV bridge while there
+    is no store yet; reading never creates the store (see
+    bridge_store.read_bridge).
+    """
+    return read_bridge(path, PATH_BRIDGE_CSV)
+
+
+def _load_demographics (path):
+    """Demographics by zip code (JURISDICTION NAME)."""
+    return pd.read_csv(path, encoding='utf-8-sig')
+
+
+#####################################################################
+# Registry.
+
+DATASETS = {}
+
+
+def register (name, path, loader, companions=()):
+    """Adds dataset to the registry, replacing any of the same name."""
+    DATASETS[name] = Dataset(name, path, loader, companions)
+    return DATASETS[name]
+
+
+def get (name):
+    """Returns registered Dataset of given name."""
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise KeyError('Unknown dataset {0}; expected one of {1}.'.format(
+              name, sorted(DATASETS))) from None
+
+
+def load (name):
+    """Returns DF of dataset of given name, loading it on first access."""
+    return get(name).load()
+
+
+def path (name):
+    """Returns path of dataset of given name."""
+    return get(name).path
+
+
+def invalidate_all ():
+    for dataset in DATASETS.values():
+        dataset.invalidate()
+
+
+register('inspections', PATH_INSPECTIONS, inspections.load_inspections)
+register('yelp', PATH_YELP_DATA, _load_yelp)
+register('bridge', PATH_BRIDGE_STORE, _load_bridge,
+         companions=[PATH_BRIDGE_STORE + '-wal', PATH_BRIDGE_CSV])
+register('demographics', PATH_DEMOGRAPHICS, _load_demographics)
+register('model_data', PATH_MODEL_DATA, pd.read_csv)
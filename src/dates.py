@@ -0,0 +1,110 @@
+"""
+Dates
+-----
+Vectorized parsing of the date columns of the NYC inspections data, which
+mix M/D/YYYY strings with Excel serial numbers (5-digit strings like 42927).
+Replaces the row-wise get_excel_date() of the data_prep notebook.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Day that Excel serial number 0 stands for. Same convention as the
+# notebook's get_excel_date() (Excel itself uses 1899-12-30), so dates agree
+# with model_data.csv.
+EXCEL_EPOCH = '1900-01-01'
+
+DATE_FORMAT = '%m/%d/%Y'
+
+# Kinds of values assigned by classify_dates().
+MISSING, SERIAL, FORMATTED, INVALID = 'missing', 'serial', 'formatted', 'invalid'
+
+
+def classify_dates (values):
+    """Classifies each value of Series as MISSING, SERIAL (5 digits),
+    FORMATTED (M/D/YYYY) or INVALID (anything else).
+
+    Returns:
+        pd.Series: Categorical kinds, with same index as values.
+    """
+    text = values.astype(object)
+    kinds = np.full(len(text), INVALID, dtype=object)
+    kinds[text.str.fullmatch(r'\d{5}').fillna(False).to_numpy(bool)] = SERIAL
+    kinds[text.str.fullmatch(r'\d{1,2}/\d{1,2}/\d{4}').fillna(False)
+          .to_numpy(bool)] = FORMATTED
+    kinds[text.isnull().to_numpy()] = MISSING
+    return pd.Series(pd.Categorical(kinds, categories=[MISSING, SERIAL,
+                                                       FORMATTED, INVALID]),
+                     index=values.index)
+
+
+def _parse_unique_dates (values, excel_epoch):
+    """parse_dates() for Series without repeated values.
+
+    Returns:
+        (np.ndarray, pd.Series): datetime64[ns] array and kinds of values.
+    """
+    kinds = classify_dates(values)
+    text = values.astype(object)
+    serial = (kinds == SERIAL).to_numpy()
+    formatted = (kinds == FORMATTED).to_numpy()
+
+    result = np.full(len(text), np.datetime64('NaT'), dtype='datetime64[ns]')
+    result[formatted] = pd.to_datetime(text[formatted], format=DATE_FORMAT,
+                                       errors='coerce').to_numpy()
+    days = pd.to_numeric(text[serial])
+    result[serial] = (pd.Timestamp(excel_epoch) +
+                      pd.to_timedelta(days, unit='D')).to_numpy()
+    return result, kinds
+
+
+def _parse (values, excel_epoch):
+    """Parses each distinct value of Series once.
+
+    Returns:
+        (pd.Series, pd.Series): Parsed dates, and whether each value was
+        present but couldn't be parsed.
+    """
+    codes, uniques = pd.factorize(values)
+    dates, kinds = _parse_unique_dates(pd.Series(uniques, dtype=object),
+                                       excel_epoch)
+    failed = (kinds != MISSING).to_numpy() & np.isnat(dates)
+    present = codes >= 0
+    result = np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+    result[present] = dates[codes[present]]
+    return (pd.Series(result, index=values.index),
+            pd.Series(present & failed[codes], index=values.index))
+
+
+def parse_dates (values, excel_epoch=EXCEL_EPOCH):
+    """Converts Series of M/D/YYYY strings and Excel serial numbers to
+    datetime64[ns]. Missing and invalid values (including M/D/YYYY strings
+    that aren't real dates) become NaT. Each distinct value is parsed once.
+
+    Args:
+        values (pd.Series): Dates as str.
+        excel_epoch (str): Day that serial number 0 stands for.
+    """
+    return _parse(values, excel_epoch)[0]
+
+
+def parse_date_columns (df, columns, excel_epoch=EXCEL_EPOCH):
+    """Replaces given str columns of df with parsed datetime64 columns.
+
+    Args:
+        df (pd.DataFrame): DF to update in place.
+        columns (List[str]): Date columns to parse.
+        excel_epoch (str): Day that serial number 0 stands for.
+
+    Returns:
+        pd.DataFrame: Report of non-missing values that couldn't be parsed,
+        with column, value and count of rows.
+    """
+    unparsed = []
+    for col in columns:
+        dates, failed = _parse(df[col], excel_epoch)
+        counts = df.loc[failed, col].astype(object).value_counts()
+        unparsed.append(pd.DataFrame({'column':col, 'value':counts.index,
+                                      'count':counts.to_numpy()}))
+        df[col] = dates
+    return pd.concat(unparsed, ignore_index=True)
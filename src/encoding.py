@@ -0,0 +1,112 @@
+"""
+Encoding
+--------
+Multi-hot encoding of list-valued columns (violation codes, Yelp categories
+and transactions) into sparse indicator matrices. Each distinct row value is
+tokenized once, replacing the notebook's one pass over the whole column per
+vocabulary entry.
+"""
+
+import collections
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def clean_list_format (values):
+    """Vectorized fix_list_format() of the data_prep notebook: turns str
+    representations of lists (e.g. "['pizza', 'bars']") into '|'-separated
+    tokens (e.g. 'pizza|bars'). Missing values become 'nan'.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    text = pd.Series([str(u) for u in uniques], dtype=object)
+    for c in '\'"[]':
+        text = text.str.strip().str.replace(c, '', regex=False)
+    text = text.str.replace(',', '|', regex=False).str.replace(' ', '',
+                                                              regex=False)
+    return pd.Series(text.to_numpy()[codes], index=values.index, dtype=object)
+
+
+class MultiHotEncoder:
+    """Encodes Series of sep-separated tokens as a sparse CSR matrix with one
+    column per token of a sorted (so stable) vocabulary.
+
+    Attributes
+    ----------
+    vocabulary: List[str]
+        Tokens kept by fit(), sorted.
+    counts: Dict[str, int]
+        Number of rows containing each token seen by fit(), before pruning.
+    """
+
+    def __init__ (self, prefix='', sep='|', min_count=1):
+        """
+        Args:
+            prefix (str): Prepended to tokens to make feature names.
+            sep (str): Token separator.
+            min_count (int): Tokens present in fewer rows than this are
+            dropped from the vocabulary (the notebook's min_obs).
+        """
+        self.prefix = prefix
+        self.sep = sep
+        self.min_count = min_count
+        self.vocabulary = []
+        self.counts = {}
+        self._columns = {}
+
+    def _tokenize (self, values):
+        """Returns codes of rows in values and the token set of each distinct
+        value. Missing values have no tokens.
+        """
+        codes, uniques = pd.factorize(values)
+        tokens = [set(str(u).split(self.sep)) for u in uniques]
+        return codes, tokens
+
+    def fit (self, values):
+        """Builds vocabulary out of tokens in values."""
+        codes, tokens = self._tokenize(values)
+        rows_per_value = np.bincount(codes[codes >= 0], minlength=len(tokens))
+        counts = collections.Counter()
+        for value_tokens, rows in zip(tokens, rows_per_value):
+            for token in value_tokens:
+                counts[token] += int(rows)
+        self.counts = dict(counts)
+        self.vocabulary = sorted(token for token, count in counts.items()
+                                 if count >= self.min_count)
+        self._columns = {token:i for i, token in enumerate(self.vocabulary)}
+        return self
+
+    def transform (self, values):
+        """Encodes values; tokens outside the vocabulary are ignored.
+
+        Returns:
+            sp.csr_matrix: uint8 matrix of shape (len(values), vocabulary
+            size) with a 1 where a row contains a token.
+        """
+        codes, tokens = self._tokenize(values)
+        indptr = [0]
+        indices = []
+        for value_tokens in tokens:
+            indices.extend(sorted(self._columns[token] for token in value_tokens
+                                  if token in self._columns))
+            indptr.append(len(indices))
+        # One extra, empty row for missing values (code -1).
+        indptr.append(len(indices))
+        unique_matrix = sp.csr_matrix(
+              (np.ones(len(indices), dtype=np.uint8), indices, indptr),
+              shape=(len(tokens) + 1, len(self.vocabulary)))
+        codes = np.where(codes >= 0, codes, len(tokens))
+        return unique_matrix[codes]
+
+    def fit_transform (self, values):
+        return self.fit(values).transform(values)
+
+    @property
+    def feature_names (self):
+        return [self.prefix + token for token in self.vocabulary]
+
+    def to_frame (self, matrix, index=None):
+        """Converts encoded matrix to a dense DF with one column per feature."""
+        return pd.DataFrame(matrix.toarray(), columns=self.feature_names,
+                            index=index)
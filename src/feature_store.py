@@ -0,0 +1,252 @@
+"""
+Feature Store
+-------------
+Incrementally maintained inspection history features (see history), keyed by
+(camis, inspection_date), for appending monthly slices of inspections without
+recomputing earlier ones.
+
+For each restaurant the store carries running state: count, mean and sum of
+squared deviations (M2) of valid scores, their max, and the date and score of
+the last inspection. Appending a batch combines that state with the batch's
+own cumulative sums, so it takes time proportional to the batch, not to the
+history.
+
+A store saved to a directory holds state.parquet plus one
+features-NNNNN.parquet file per appended batch; saving only writes the state
+and the new batches.
+"""
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from frame_cache import write_frame
+from history import HISTORY_COLUMNS
+
+STATE_COLUMNS = ['count', 'mean', 'm2', 'max', 'last_date', 'last_score']
+
+# Initial number of restaurants state arrays have room for.
+INITIAL_CAPACITY = 1024
+
+
+class HistoryStore:
+    """Running per-restaurant inspection history and the features of every
+    appended inspection.
+
+    Attributes
+    ----------
+    batches: List[pd.DataFrame]
+        HISTORY_COLUMNS of each appended batch, indexed by (camis,
+        inspection_date).
+    """
+
+    def __init__ (self):
+        self.batches = []
+        self._saved_batches = 0
+        self._slots = {}  # camis -> position in state arrays.
+        self._size = 0
+        self._state = {
+            'count':np.zeros(INITIAL_CAPACITY),
+            'mean':np.zeros(INITIAL_CAPACITY),
+            'm2':np.zeros(INITIAL_CAPACITY),
+            'max':np.full(INITIAL_CAPACITY, -np.inf),
+            'last_date':np.full(INITIAL_CAPACITY, np.datetime64('NaT'),
+                                dtype='datetime64[ns]'),
+            'last_score':np.full(INITIAL_CAPACITY, np.nan),
+            }
+
+    def __len__ (self):
+        return sum(len(batch.index) for batch in self.batches)
+
+    def _get_slots (self, ids):
+        """Returns state positions of restaurants ids, allocating new ones
+        (with empty state) for restaurants not seen before.
+        """
+        slots = np.empty(len(ids), dtype=np.int64)
+        for i, camis in enumerate(ids):
+            slot = self._slots.get(camis)
+            if slot is None:
+                slot = self._slots[camis] = self._size
+                self._size += 1
+            slots[i] = slot
+
+        capacity = len(self._state['count'])
+        if self._size > capacity:
+            while capacity < self._size:
+                capacity *= 2
+            for name, values in self._state.items():
+                empty = {'max':-np.inf, 'last_date':np.datetime64('NaT'),
+                         'last_score':np.nan}.get(name, 0)
+                grown = np.full(capacity, empty, dtype=values.dtype)
+                grown[:len(values)] = values
+                self._state[name] = grown
+        return slots
+
+    def append (self, df, camis='camis', date='inspection_date',
+                score='score'):
+        """Adds a batch of inspections, computing their history features from
+        the running state and updating it.
+
+        Args:
+            df (pd.DataFrame): One row per inspection.
+            camis (str): Restaurant id column.
+            date (str): datetime64 inspection date column.
+            score (str): Inspection score column.
+
+        Returns:
+            pd.DataFrame: HISTORY_COLUMNS of the batch, with same index as df;
+            same values as history.history_features() over all inspections
+            appended so far.
+
+        Raises:
+            ValueError if a restaurant has more than one inspection on a date,
+            or an inspection isn't later than the restaurant's last one in the
+            store (rewriting history requires rebuilding the store).
+        """
+        if df.duplicated([camis, date]).any():
+            raise ValueError('Inspections not unique by {0} and {1}.'.format(
+                  camis, date))
+        if df.empty:
+            return pd.DataFrame(index=df.index, columns=HISTORY_COLUMNS,
+                                dtype=float)
+
+        order = np.lexsort((df[date].to_numpy(), df[camis].to_numpy()))
+        ids = df[camis].to_numpy()[order]
+        dates = df[date].to_numpy(dtype='datetime64[ns]')[order]
+        scores = df[score].to_numpy(dtype=float, na_value=np.nan)[order]
+        # First and last batch row of each restaurant.
+        first = np.r_[True, ids[1:] != ids[:-1]]
+        last = np.r_[first[1:], True]
+        groups = np.cumsum(first) - 1
+        slots = self._get_slots(ids[first])
+        row_slots = slots[groups]
+
+        state = {name:values[row_slots]
+                 for name, values in self._state.items()}
+        late = ~np.isnat(state['last_date']) & ~(dates > state['last_date'])
+        if late.any():
+            raise ValueError('{0} inspections not later than the last stored '
+                             'inspection of their restaurant.'.format(
+                                   late.sum()))
+
+        def cumulative_before (values):
+            """Cumulative sum per restaurant of earlier batch rows' values."""
+            return (pd.Series(values).groupby(groups).cumsum().to_numpy() -
+                    values)
+
+        def previous (values, stored):
+            """Value of the previous inspection, from state for the first
+            batch row of a restaurant.
+            """
+            shifted = np.roll(values, 1)
+            return np.where(first, stored, shifted)
+
+        # Earlier valid scores within the batch.
+        valid = ~np.isnan(scores)
+        filled = np.where(valid, scores, 0)
+        count_b = cumulative_before(valid.astype(float))
+        total_b = cumulative_before(filled)
+        mean_b = np.divide(total_b, count_b, out=np.zeros_like(total_b),
+                           where=count_b > 0)
+        m2_b = np.maximum(cumulative_before(filled**2) - total_b*mean_b, 0)
+        max_b = previous(pd.Series(np.where(valid, scores, -np.inf))
+                         .groupby(groups).cummax().to_numpy(), -np.inf)
+
+        # Combine with stored state (Chan et al.'s parallel variance update).
+        count = state['count'] + count_b
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean_b - state['mean']
+            mean = np.where(count > 0, state['mean'] + delta*count_b/count, 0)
+            m2 = (state['m2'] + m2_b +
+                  np.where(count > 0,
+                           delta**2*state['count']*count_b/count, 0))
+            std = np.sqrt(m2/(count - 1))
+        maximum = np.maximum(state['max'], max_b)
+        has_history = count > 0
+        prev_dates = previous(dates, state['last_date'])
+
+        features = pd.DataFrame({
+            'score_prev':previous(scores, state['last_score']),
+            'score_avg':np.where(has_history, mean, np.nan),
+            'score_std':np.where(count > 1, std, np.nan),
+            'score_max':np.where(has_history, maximum, np.nan),
+            'score_cnt':np.where(has_history, count, np.nan),
+            'time_since_prev':(pd.Series(dates - prev_dates).dt.days/365
+                               ).to_numpy(),
+            }, columns=HISTORY_COLUMNS)
+
+        # State after each restaurant's last batch row includes that row.
+        count_after = count + valid
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = scores - mean
+            mean_after = np.where(valid, mean + delta/count_after, mean)
+            m2_after = np.where(valid, m2 + delta*(scores - mean_after), m2)
+        rows = np.flatnonzero(last)
+        updates = {'count':count_after, 'mean':mean_after, 'm2':m2_after,
+                   'max':np.where(valid, np.maximum(maximum, scores), maximum),
+                   'last_date':dates, 'last_score':scores}
+        for name, values in updates.items():
+            self._state[name][slots] = values[rows]
+
+        batch = features.copy()
+        batch.index = pd.MultiIndex.from_arrays([ids, dates],
+                                                names=['camis',
+                                                       'inspection_date'])
+        self.batches.append(batch)
+
+        # Undo sort.
+        features = features.iloc[np.argsort(order)]
+        features.index = df.index
+        return features
+
+    @property
+    def features (self):
+        """HISTORY_COLUMNS of all appended inspections, indexed by (camis,
+        inspection_date).
+        """
+        if not self.batches:
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+        return pd.concat(self.batches)
+
+    @property
+    def state (self):
+        """Running state of each restaurant, indexed by camis."""
+        ids = np.empty(self._size, dtype=object)
+        for camis, slot in self._slots.items():
+            ids[slot] = camis
+        state = pd.DataFrame({name:values[:self._size]
+                              for name, values in self._state.items()},
+                             columns=STATE_COLUMNS)
+        state.index = pd.Index(list(ids), name='camis')
+        return state
+
+    def save (self, directory):
+        """Writes state, and batches appended since the last save, to
+        directory.
+        """
+        for i in range(self._saved_batches, len(self.batches)):
+            write_frame(self.batches[i], os.path.join(
+                  directory, 'features-{:05d}.parquet'.format(i)))
+        self._saved_batches = len(self.batches)
+        write_frame(self.state, os.path.join(directory, 'state.parquet'))
+
+    @classmethod
+    def load (cls, directory):
+        """Reads store written by save(), or returns an empty store if
+        directory has none.
+        """
+        store = cls()
+        state_path = os.path.join(directory, 'state.parquet')
+        if not os.path.exists(state_path):
+            return store
+
+        state = pd.read_parquet(state_path)
+        store._get_slots(state.index.tolist())
+        for name in STATE_COLUMNS:
+            store._state[name][:len(state.index)] = state[name].to_numpy()
+        store.batches = [pd.read_parquet(path) for path in sorted(
+              glob.glob(os.path.join(directory, 'features-*.parquet')))]
+        store._saved_batches = len(store.batches)
+        return store
@@ -0,0 +1,86 @@
+"""
+Frame Cache
+-----------
+Caches DataFrames built from a source file as typed, columnar Parquet files
+in a cache directory next to the source. A cached frame is only used while
+the content hash of the source (and the caller's key) is unchanged, so
+editing or replacing the source file invalidates it.
+
+Parquet support needs pyarrow; without it frames are simply rebuilt.
+"""
+
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:  # caching is an optimization, so it's optional.
+    pyarrow = None
+
+CACHE_DIR_NAME = 'cache'
+
+
+def file_hash (path, chunk_size=1 << 20):
+    """Returns SHA-256 hex digest of the file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path (source, name, key=''):
+    """Returns path of the Parquet file caching frame name built from source.
+
+    Args:
+        source (str): Path of file the frame is built from.
+        name (str): Name of the cached frame.
+        key (str): Anything else the frame depends on, e.g. a version of the
+        code that builds it.
+    """
+    digest = hashlib.sha256(
+          '{0}:{1}'.format(file_hash(source), key).encode('utf-8')).hexdigest()
+    cache_dir = os.path.join(os.path.dirname(source), CACHE_DIR_NAME)
+    return os.path.join(cache_dir, '{0}-{1}.parquet'.format(name, digest[:16]))
+
+
+def write_frame (df, path):
+    """Writes df to Parquet at path atomically (readers never see a partial
+    file).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    df.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def cached_frame (source, build, name, key=''):
+    """Returns build(), reading it from the cache if it was already built from
+    the current contents of source.
+
+    Args:
+        source (str): Path of file the frame is built from.
+        build (Callable[[], pd.DataFrame]): Builds the frame from source.
+        name (str): Name of the cached frame.
+        key (str): Anything else the frame depends on.
+
+    Returns:
+        pd.DataFrame: Frame built by build().
+    """
+    if pyarrow is None:
+        return build()
+
+    path = cache_path(source, name, key)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+
+    df = build()
+    # Remove stale copies built from earlier versions of source.
+    for stale_path in glob.glob(os.path.join(os.path.dirname(path),
+                                             name + '-*.parquet')):
+        os.remove(stale_path)
+    write_frame(df, path)
+    return df
@@ -0,0 +1,80 @@
+"""
+Inspection History
+------------------
+Features describing a restaurant's earlier inspections, for every inspection:
+the previous score, the mean, std, max and count of all earlier scores, and
+the time since the previous inspection.
+
+Inspections are sorted once by (camis, inspection_date) and the features
+computed with shifted cumulative group-wise operations, so time and memory
+are linear in the number of inspections (the notebook's self-merge on camis
+was quadratic per restaurant).
+"""
+
+import numpy as np
+import pandas as pd
+
+HISTORY_COLUMNS = ['score_prev', 'score_avg', 'score_std', 'score_max',
+                   'score_cnt', 'time_since_prev']
+
+
+def history_features (df, camis='camis', date='inspection_date',
+                      score='score'):
+    """Computes inspection history features for each row of df.
+
+    Features of a restaurant's first inspection are NaN, as are score_std
+    with only one earlier score. time_since_prev is in years (days / 365).
+
+    Args:
+        df (pd.DataFrame): One row per inspection.
+        camis (str): Restaurant id column.
+        date (str): datetime64 inspection date column.
+        score (str): Inspection score column.
+
+    Returns:
+        pd.DataFrame: HISTORY_COLUMNS, with same index as df.
+
+    Raises:
+        ValueError if a restaurant has more than one inspection on a date.
+    """
+    if df.duplicated([camis, date]).any():
+        raise ValueError('Inspections not unique by {0} and {1}.'.format(
+              camis, date))
+
+    order = np.lexsort((df[date].to_numpy(), df[camis].to_numpy()))
+    ids = df[camis].to_numpy()[order]
+    dates = pd.Series(df[date].to_numpy()[order])
+    scores = pd.Series(df[score].to_numpy(dtype=float, na_value=np.nan)[order])
+    first = np.r_[True, ids[1:] != ids[:-1]]  # first inspection of restaurant
+    groups = np.cumsum(first)
+
+    def previous (values):
+        """Value of the previous inspection of the same restaurant."""
+        return values.shift(1).where(~first)
+
+    def cumulative_before (values):
+        """Cumulative sum per restaurant of earlier inspections' values."""
+        return values.groupby(groups).cumsum() - values
+
+    valid = scores.notnull().astype(float)
+    filled = scores.fillna(0)
+    count = cumulative_before(valid)
+    total = cumulative_before(filled)
+    total_sq = cumulative_before(filled**2)
+    has_history = count > 0
+
+    features = pd.DataFrame({
+        'score_prev':previous(scores),
+        'score_avg':(total/count).where(has_history),
+        'score_std':np.sqrt(((total_sq - total**2/count)/(count - 1)).clip(
+              lower=0)).where(count > 1),
+        'score_max':previous(scores.fillna(-np.inf).groupby(groups).cummax()
+                             ).where(has_history),
+        'score_cnt':count.where(has_history),
+        'time_since_prev':(dates - previous(dates)).dt.days/365,
+        }, columns=HISTORY_COLUMNS)
+
+    # Undo sort.
+    features = features.iloc[np.argsort(order)]
+    features.index = df.index
+    return features
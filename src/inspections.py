@@ -0,0 +1,120 @@
+"""
+NYC Inspections Data
+--------------------
+Loading and preliminary data-cleaning of the NYC restaurant inspections data,
+shared by data_prep and data_integrity.
+
+The CSV is read with the declared types of schema.INSPECTIONS_DTYPES, and
+cleaned data is cached in a columnar file next to the source CSV, so only
+the first load after the CSV changes parses it.
+
+Extracts too large to hold in memory can instead be cleaned chunk by chunk
+into a Parquet file with ingest_inspections().
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from addresses import clean_street_addresses, create_full_addresses
+from frame_cache import cached_frame
+from paths import DATA_DIR
+from schema import INSPECTIONS_DTYPES, iter_inspections, read_inspections
+
+PATH_INSPECTIONS = os.path.join(DATA_DIR,
+                                'nyc_restaurant_inspection_data.csv')
+
+# Bump whenever clean_inspections() changes so cached copies are rebuilt.
+CLEANING_VERSION = 3
+
+# Rows of CSV cleaned at a time by ingest_inspections().
+CHUNK_SIZE = 50000
+
+
+def clean_inspections (df):
+    """Handles preliminary data-cleaning of NYC inspections DF."""
+    # Remove records not containing a zip code and ensure zip code is an int.
+    df = df[df['ZIPCODE'].notnull()].copy()
+    df['ZIPCODE'] = df['ZIPCODE'].astype(np.int64)
+    # Format street address.
+    df['STREET'] = clean_street_addresses(df['STREET'])
+    # Create full address used for Yelp API.
+    df['FULL_ADDRESS'] = create_full_addresses(df)
+    df['YELP_ID'] = np.nan  # will be added later.
+    return df
+
+
+def load_inspections (url=PATH_INSPECTIONS, use_cache=True):
+    """Creates DF from NYC inspections data and handles preliminary
+    data-cleaning.
+
+    Args:
+        url (str): Path of inspections CSV.
+        use_cache (bool): If True, reads cleaned data from (and saves it to)
+        the cache; else always parses and cleans the CSV.
+    """
+    def build ():
+        return clean_inspections(read_inspections(url))
+
+    if not use_cache:
+        return build()
+    return cached_frame(url, build, 'inspections',
+                        key='v{}'.format(CLEANING_VERSION))
+
+
+def ingest_inspections (url, sink_path, chunksize=CHUNK_SIZE):
+    """Cleans NYC inspections CSV chunksize rows at a time, appending each
+    cleaned chunk to Parquet file at sink_path. Peak memory depends on
+    chunksize, not on the size of the CSV.
+
+    Categorical columns are stored as strings (which Parquet dictionary-encodes)
+    since categories differ between chunks; read_ingested_inspections()
+    restores them.
+
+    Returns:
+        int: Number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    rows = 0
+    try:
+        for chunk in iter_inspections(url, chunksize):
+            chunk = clean_inspections(chunk)
+            categoricals = chunk.select_dtypes('category').columns
+            chunk = chunk.astype({col:object for col in categoricals})
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                schema = pa.schema([
+                      pa.field(f.name, pa.string())
+                      if f.name in categoricals or pa.types.is_null(f.type)
+                      else f for f in schema])
+                writer = pq.ParquetWriter(sink_path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema,
+                                                    preserve_index=False))
+            rows += len(chunk.index)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def read_ingested_inspections (path, columns=None):
+    """Reads cleaned inspections written by ingest_inspections().
+
+    Args:
+        path (str): Parquet file written by ingest_inspections().
+        columns (List[str]): Columns to read; all if None.
+    """
+    df = pd.read_parquet(path, columns=columns)
+    # Restore categoricals, and nullable ints that come back as floats.
+    dtypes = {}
+    for col, dtype in INSPECTIONS_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category' or (dtype == 'Int64' and
+                                   df[col].dtype.kind == 'f'):
+            dtypes[col] = dtype
+    return df.astype(dtypes)
@@ -0,0 +1,158 @@
+"""
+Match Quality
+-------------
+Verifies that each CAMIS/Yelp ID pair of the bridge is the same restaurant,
+replacing the manual row counts at the end of data_prep and data_integrity.
+
+Every pair is scored on name similarity (DBA vs. Yelp name), address equality
+(FULL_ADDRESS vs. Yelp address, both canonicalized), zip match, phone match and
+geodistance, all computed column-wise. Inspections carry no coordinates, so
+geodistance is the distance from the Yelp business to the centroid of the
+Yelp businesses in the inspection's zip code.
+
+The checks are combined into a confidence in [0, 1]: the weighted mean of
+the checks that could be made (e.g. phone is skipped when either side has
+none). Pairs below REJECT_THRESHOLD make up the reject list.
+"""
+
+import numpy as np
+import pandas as pd
+
+from addresses import canonical_addresses
+from similarity import pair_similarity
+
+# Weight of each check in the confidence.
+WEIGHTS = {
+    'name_sim':0.35,
+    'address_match':0.25,
+    'zip_match':0.15,
+    'phone_match':0.15,
+    'geo_score':0.10,
+    }
+
+# Pairs with lower confidence are rejected.
+REJECT_THRESHOLD = 0.5
+
+# Geodistance (km) below which geo_score is 1, and above which it is 0.
+NEAR_KM, FAR_KM = 1.0, 5.0
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km (lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between arrays of coordinates (degrees)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float))
+                              for x in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1)/2)**2 +
+         np.cos(lat1)*np.cos(lat2)*np.sin((lon2 - lon1)/2)**2)
+    return 2*EARTH_RADIUS_KM*np.arcsin(np.sqrt(a))
+
+
+def zip_centroids (yelp_df):
+    """Median latitude and longitude of Yelp businesses by zip code.
+
+    Returns:
+        pd.DataFrame: latitude and longitude, indexed by int zip code.
+    """
+    df = pd.DataFrame({
+        'zip_code':normalize_zips(yelp_df['zip_code']),
+        'latitude':pd.to_numeric(yelp_df['latitude'], errors='coerce'),
+        'longitude':pd.to_numeric(yelp_df['longitude'], errors='coerce'),
+        })
+    return df.dropna().groupby('zip_code')[['latitude', 'longitude']].median()
+
+
+def normalize_zips (values):
+    """Converts zip codes (int, float or str like '10001-1234') to float
+    5-digit ints, NaN where missing or invalid.
+    """
+    text = values.astype(object).astype(str).str.extract(r'^\s*(\d{5})')[0]
+    return pd.to_numeric(text, errors='coerce')
+
+
+def normalize_phones (values):
+    """Reduces phone numbers to their last 10 digits (dropping a leading +1
+    and punctuation); None where fewer than 10 digits.
+    """
+    text = values.astype(object).astype(str).str.replace(r'\.0$', '',
+                                                         regex=True)
+    digits = text.str.replace(r'\D', '', regex=True)
+    return digits.str[-10:].where(digits.str.len() >= 10)
+
+
+def _restaurants (inspections_df):
+    """One row per CAMIS of inspections DF, indexed by CAMIS."""
+    df = inspections_df.drop_duplicates('CAMIS')
+    return df.set_index('CAMIS', drop=False)[['DBA', 'FULL_ADDRESS',
+                                              'ZIPCODE', 'PHONE']]
+
+
+def score_matches (bridge_df, inspections_df, yelp_df, weights=WEIGHTS):
+    """Scores every CAMIS/Yelp ID pair of bridge.
+
+    Args:
+        bridge_df (pd.DataFrame): CAMIS and YELP_ID columns; pairs without
+        YELP_ID are skipped.
+        inspections_df (pd.DataFrame): Cleaned inspections (see inspections)
+        with CAMIS, DBA, FULL_ADDRESS, ZIPCODE and PHONE.
+        yelp_df (pd.DataFrame): Yelp business data (see yelp_data) with id,
+        name, address, zip_code, phone, latitude and longitude.
+        weights (Dict[str, float]): Weight of each check in confidence.
+
+    Returns:
+        pd.DataFrame: CAMIS, YELP_ID, the checks (name_sim, address_match,
+        zip_match, phone_match in [0, 1], NaN if they couldn't be made;
+        distance_km and geo_score) and confidence, one row per scored pair.
+    """
+    pairs = bridge_df.loc[bridge_df['YELP_ID'].notnull(), ['CAMIS', 'YELP_ID']]
+    pairs = pairs.reset_index(drop=True)
+    nyc = _restaurants(inspections_df).reindex(pairs['CAMIS'].to_numpy())
+    yelp = (yelp_df.drop_duplicates('id').set_index('id')
+            .reindex(pairs['YELP_ID'].to_numpy()))
+    nyc.index = yelp.index = pairs.index
+
+    scores = pairs.copy()
+    scores['name_sim'] = pair_similarity(nyc['DBA'], yelp['name'],
+                                         metric='token_set_ratio')
+
+    nyc_address = canonical_addresses(nyc['FULL_ADDRESS'])
+    yelp_address = canonical_addresses(yelp['address'])
+    scores['address_match'] = (nyc_address == yelp_address).astype(
+          float).where(nyc_address.notnull() & yelp_address.notnull())
+
+    nyc_zip = normalize_zips(nyc['ZIPCODE'])
+    yelp_zip = normalize_zips(yelp['zip_code'])
+    scores['zip_match'] = (nyc_zip == yelp_zip).astype(float).where(
+          nyc_zip.notnull() & yelp_zip.notnull())
+
+    nyc_phone = normalize_phones(nyc['PHONE'])
+    yelp_phone = normalize_phones(yelp['phone'])
+    scores['phone_match'] = (nyc_phone == yelp_phone).astype(float).where(
+          nyc_phone.notnull() & yelp_phone.notnull())
+
+    centroids = zip_centroids(yelp_df).reindex(nyc_zip.to_numpy())
+    scores['distance_km'] = haversine_km(
+          centroids['latitude'], centroids['longitude'],
+          pd.to_numeric(yelp['latitude'], errors='coerce'),
+          pd.to_numeric(yelp['longitude'], errors='coerce'))
+    scores['geo_score'] = ((FAR_KM - scores['distance_km'])/
+                           (FAR_KM - NEAR_KM)).clip(0, 1)
+
+    checks = scores[list(weights)]
+    weight = pd.Series(weights)
+    available = checks.notnull()
+    scores['confidence'] = ((checks.fillna(0)*weight).sum(axis=1)/
+                            (available*weight).sum(axis=1)).fillna(0)
+    return scores
+
+
+def reject_list (scores, threshold=REJECT_THRESHOLD, weights=WEIGHTS):
+    """Pairs of score_matches() with confidence below threshold, lowest
+    first, with the failed checks (score below 0.5) listed in reasons.
+    Checks are the keys of weights, as passed to score_matches().
+    """
+    rejects = scores[scores['confidence'] < threshold].copy()
+    failed = rejects[list(weights)] < 0.5
+    rejects['reasons'] = [';'.join(failed.columns[row])
+                          for row in failed.to_numpy()]
+    return rejects.sort_values('confidence')
@@ -0,0 +1,276 @@
+"""
+Model Data
+----------
+Builds model_data.csv (one row per inspection with Yelp, name, census and
+history features) as a pipeline of cached stages, following the data_prep
+notebook:
+
+    inspections, yelp -> base -> transactions  -\\
+                                 categories     |
+                                 violations     |
+                                 name_features  +-> model_data
+               demographics -> census         |
+                                 dummies        |
+                                 history       -/
+
+Only stages whose code or inputs changed since the last run recompute (see
+pipeline). Run as a script to write the CSV:
+
+    python model_data.py --output PATH [--jobs N]
+
+The committed data/model_data.csv is only replaced if given as PATH.
+
+With --jobs N, independent stages (e.g. the feature stages after base) run
+on N processes; each decodes its own copy of base, so this is only faster
+with several CPUs to spare.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import datasets
+from encoding import MultiHotEncoder, clean_list_format
+from history import HISTORY_COLUMNS, history_features
+from pipeline import Pipeline, Source, Stage
+from schema import read_inspections
+from similarity import pair_similarity
+from timer import ProgramTimer
+
+log = ProgramTimer(ud_start=True, ud_end=False)
+log._start_ud_pre_txt = ''
+
+CACHE_DIR = os.path.join(datasets.DATA_DIR, 'cache', 'pipeline')
+
+# Columns identifying an inspection, in addition to the violations cited.
+MODEL_COLUMNS = ['camis', 'dba', 'boro', 'zipcode', 'cuisine_description',
+                 'inspection_date', 'inspection_year', 'inspection_month',
+                 'score', 'grade', 'name', 'latitude', 'longitude',
+                 'review_count', 'price', 'rating', 'transactions',
+                 'categories', 'city']
+
+YELP_COLUMNS = ['CAMIS', 'name', 'latitude', 'longitude', 'review_count',
+                'price', 'rating', 'transactions', 'categories', 'city']
+
+CUISINE_NAMES = {
+    'Bottled beverages, including water, sodas, juices, etc.':
+          'Bottled_beverages',
+    'CafÃ©/Coffee/Tea':'Coffee_Tea',
+    'Ice Cream, Gelato, Yogurt, Ices':'IceCream_Gelato',
+    'Juice, Smoothies, Fruit Salads':'Juice_Smoothies',
+    'Latin (Cuban, Dominican, Puerto Rican, South & Central American)':
+          'Latin',
+    'Sandwiches/Salads/Mixed Buffet':'Sandwiches',
+    'Soups & Sandwiches':'Sandwiches',
+    'Tex-Mex':'TexMex',
+    }
+
+# Yelp categories on fewer inspections are dropped.
+CATEGORY_MIN_OBS = 500
+
+# Restaurants (by DBA) with more inspections are flagged as chains.
+CHAIN_MIN_OBS = 50
+
+# Cities outside the most common are grouped as 'Other'.
+TOP_CITIES = 30
+
+TARGET_COLUMNS = ['grade', 'score', 'log_score']
+
+
+#####################################################################
+# Stages.
+
+def _lower_columns (df):
+    df.columns = [c.replace('.', '_').lower() for c in df.columns]
+    return df
+
+
+def base (inspections, yelp):
+    """One row per inspection (lowest score if a restaurant has several on a
+    date) of restaurants with a valid score, with Yelp data and the
+    '|'-separated violation codes cited.
+    """
+    df = pd.merge(inspections, yelp[YELP_COLUMNS], how='left', on='CAMIS')
+    df = _lower_columns(df)
+    df['inspection_year'] = df['inspection_date'].dt.year
+    df['inspection_month'] = df['inspection_date'].dt.month
+    df = df[df['score'].notnull() & (df['score'] >= 0)]
+
+    # Group violations such that each row is an individual inspection.
+    df = df.astype({col:object for col in df.select_dtypes('category')})
+    df['violation_code'] = df['violation_code'].fillna('NULL')
+    df = (df.groupby(MODEL_COLUMNS, dropna=False, sort=True)['violation_code']
+          .agg('|'.join).reset_index())
+
+    # Ensure rows are unique by camis and inspection date, taking the lowest
+    # score.
+    df = df.sort_values(['camis', 'inspection_date', 'score'], kind='stable')
+    df = df.drop_duplicates(['camis', 'inspection_date'])
+
+    cuisine = df['cuisine_description'].astype(str)
+    df['cuisine_description'] = cuisine.map(CUISINE_NAMES).fillna(
+          cuisine.str.strip().str.replace('/', '_').str.replace(' ', '_'))
+    return df.reset_index(drop=True)
+
+
+def _multi_hot (values, prefix, min_count=1):
+    encoder = MultiHotEncoder(prefix=prefix, min_count=min_count)
+    values = clean_list_format(values.fillna('NULL'))
+    return encoder.to_frame(encoder.fit_transform(values), index=values.index)
+
+
+def transactions (base):
+    """Indicator column per Yelp transaction type."""
+    return _multi_hot(base['transactions'], 'trans_')
+
+
+def categories (base):
+    """Indicator column per Yelp category on at least CATEGORY_MIN_OBS
+    inspections.
+    """
+    return _multi_hot(base['categories'], 'cat_', CATEGORY_MIN_OBS)
+
+
+def violations (base):
+    """Indicator column per violation code."""
+    return _multi_hot(base['violation_code'], 'violation_')
+
+
+def name_features (base):
+    """Name lengths, Levenshtein distance between DBA and Yelp name, number
+    of inspections per DBA and a chain flag.
+    """
+    dba = base['dba'].fillna('NULL')
+    name = base['name'].fillna('NULL')
+    counts = dba.map(dba.value_counts())
+    return pd.DataFrame({
+        'restaurant_name_len':dba.str.len(),
+        'restaurant_name_len_yelp':name.str.len(),
+        'restaurant_name_sim':pair_similarity(dba, name).astype(np.int64),
+        'restaurant_name_count':counts,
+        'restaurant_name_chain':(counts > CHAIN_MIN_OBS).astype(np.int64),
+        })
+
+
+def census (base, demographics):
+    """Census columns (cen_*) of each inspection's zip code, missing values
+    imputed with the mean.
+    """
+    cen = demographics.copy()
+    cen.columns = ['cen_' + c.replace(' ', '_').lower() for c in cen.columns]
+    cen = cen.rename(columns={cen.columns[0]:'zipcode'})
+    df = pd.merge(base[['zipcode']].astype(float),
+                  cen.astype({'zipcode':float}), how='left', on='zipcode')
+    df = df.drop('zipcode', axis=1)
+    df.index = base.index
+    return df.fillna(df.mean())
+
+
+def dummies (base):
+    """Dummy columns of borough and of the TOP_CITIES most common cities."""
+    boro = pd.get_dummies(base['boro'], prefix='boro', dtype=np.int64)
+    city = base['city'].fillna('NULL')
+    top = city.value_counts().index[:TOP_CITIES]
+    city = pd.get_dummies(city.where(city.isin(top), 'Other'), prefix='city',
+                          dtype=np.int64)
+    return pd.concat([boro, city], axis=1)
+
+
+def history (base):
+    """History features (see history), a first inspection flag and missing
+    values imputed with the mean.
+    """
+    df = history_features(base)
+    df['first_inspection'] = df['time_since_prev'].isnull().astype(np.int64)
+    cols = HISTORY_COLUMNS
+    df[cols] = df[cols].fillna(df[cols].mean())
+    return df
+
+
+def model_data (base, transactions, categories, violations, name_features,
+                census, dummies, history):
+    """Joins features, imputes price and rating with their most frequent
+    values and adds log_score; targets come last.
+    """
+    df = pd.concat([base.drop(['transactions', 'categories',
+                               'violation_code', 'name', 'boro', 'city'],
+                              axis=1),
+                    transactions, categories, violations, name_features,
+                    census, dummies, history], axis=1)
+    df = _lower_columns(df)
+    cols = ['rating', 'price']
+    df[cols] = df[cols].fillna(df[cols].mode().iloc[0])
+    df['log_score'] = np.log(df['score'].astype(float) + 2)
+    features = [c for c in df.columns if c not in TARGET_COLUMNS]
+    return df[features + TARGET_COLUMNS]
+
+
+#####################################################################
+# Pipeline.
+
+def read_yelp (path):
+    """Yelp business data, as built by yelp_data."""
+    return pd.read_csv(path, encoding='ISO-8859-1')
+
+
+def read_demographics (path):
+    """Demographics by zip code (JURISDICTION NAME)."""
+    return pd.read_csv(path, encoding='utf-8-sig')
+
+
+SOURCES = [
+    Source('inspections', datasets.PATH_INSPECTIONS, read_inspections),
+    Source('yelp', datasets.PATH_YELP_DATA, read_yelp),
+    Source('demographics', datasets.PATH_DEMOGRAPHICS, read_demographics),
+    ]
+
+STAGES = [
+    Stage('base', base, ['inspections', 'yelp']),
+    Stage('transactions', transactions, ['base']),
+    Stage('categories', categories, ['base']),
+    Stage('violations', violations, ['base']),
+    Stage('name_features', name_features, ['base']),
+    Stage('census', census, ['base', 'demographics']),
+    Stage('dummies', dummies, ['base']),
+    Stage('history', history, ['base']),
+    Stage('model_data', model_data,
+          ['base', 'transactions', 'categories', 'violations',
+           'name_features', 'census', 'dummies', 'history']),
+    ]
+
+
+def create_pipeline (cache_dir=CACHE_DIR, timer=log):
+    return Pipeline(SOURCES, STAGES, cache_dir, timer)
+
+
+def build_model_data (cache_dir=CACHE_DIR, jobs=1):
+    """Returns model data DF, recomputing only stale stages (on jobs
+    processes if more than 1).
+    """
+    pipeline = create_pipeline(cache_dir)
+    return pipeline.run(['model_data'], jobs=jobs)['model_data']
+
+
+def main (argv=None):
+    parser = argparse.ArgumentParser(description='Builds model_data.csv.')
+    parser.add_argument('--output', required=True,
+                        help='CSV to write; ../data/model_data.csv replaces '
+                             'the committed one')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of processes running feature stages '
+                             '(default 1)')
+    args = parser.parse_args(argv)
+
+    df = build_model_data(jobs=args.jobs)
+    log.start('Writing {}'.format(args.output))
+    df.index = pd.MultiIndex.from_arrays(
+          [df['camis'], df['inspection_date'].dt.strftime('%Y-%m-%d')])
+    df.to_csv(args.output)
+    log.end()
+    log.print_summary('Finished building model data')
+
+
+if __name__ == '__main__':
+    main()
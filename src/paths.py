@@ -0,0 +1,12 @@
+"""
+Paths
+-----
+Directories of the project, resolved relative to the repository rather than
+the working directory, so that scripts, notebooks and benchmarks read and
+write the same files wherever they're run from.
+"""
+
+import os
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.normpath(os.path.join(SRC_DIR, '..', 'data'))
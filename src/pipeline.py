@@ -0,0 +1,494 @@
+"""
+Pipeline
+--------
+Small DAG executor for multi-stage data builds such as model_data.
+
+Sources are data files; stages are functions of named inputs (sources or
+other stages' outputs) returning DataFrames. Each output is cached on disk as
+an uncompressed Arrow IPC (Feather) file under a key hashing the stage's name, code and version together with
+the keys of its inputs (source keys hash the file contents and the loader's
+code), so editing a stage or a source only recomputes the stages downstream
+of it. A stage's code
+includes the project functions, classes and constants it refers to,
+directly or through each other (see code_dependencies), so editing a helper
+also recomputes the stages using it. Stage timings
+and cache hits are reported through a ProgramTimer.
+
+Cached files are memory-mapped when read, and as Arrow's layout is that of
+the frame's columns, numeric columns are used in place rather than decoded
+(string columns are still converted). With run(jobs=N), stale stages whose
+inputs are ready run concurrently on a pool of N processes. Frames aren't
+pickled through the pool: each worker maps its inputs from the cache
+(sources are first written there too) and writes its outputs back, so
+workers reading the same input share its pages through the OS page cache.
+Parallel runs still only pay off when there are CPUs to spare (on one or
+two CPUs, jobs=1, the default, is faster). Each stage's outputs are the same
+however stages are scheduled, and results are returned in stage order, so
+output is deterministic.
+
+Caching needs pyarrow; without it every stage recomputes, and in sequence.
+"""
+
+import concurrent.futures
+import glob
+import hashlib
+import inspect
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+from frame_cache import file_hash, pyarrow
+from paths import SRC_DIR
+from timer import ProgramTimer
+
+
+#####################################################################
+# Code hashing.
+
+def _code_names (code):
+    """Global names used by code object, including nested ones (e.g. of
+    comprehensions and lambdas).
+    """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _constant_repr (value):
+    """Stable repr of a plain constant (numbers, str, regex and containers
+    of them), or None if value isn't one.
+    """
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return repr(value)
+    if isinstance(value, re.Pattern):
+        return 're.compile({0!r}, {1})'.format(value.pattern, value.flags)
+    if isinstance(value, (list, tuple, set, frozenset, dict)):
+        items = value.items() if isinstance(value, dict) else value
+        if isinstance(value, dict):
+            reprs = [(_constant_repr(k), _constant_repr(v)) for k, v in items]
+            ok = all(k is not None and v is not None for k, v in reprs)
+        else:
+            reprs = [_constant_repr(item) for item in items]
+            ok = all(r is not None for r in reprs)
+        if not ok:
+            return None
+        if isinstance(value, (set, frozenset, dict)):
+            reprs = sorted(reprs)  # set order varies between processes
+        return '{0}({1})'.format(type(value).__name__, reprs)
+    return None
+
+
+def _is_project (obj, root):
+    try:
+        path = inspect.getsourcefile(obj)
+    except TypeError:  # built-in
+        return False
+    return path is not None and os.path.abspath(path).startswith(
+          os.path.join(root, ''))
+
+
+def code_dependencies (func, root=SRC_DIR):
+    """Source of func and of the functions and classes defined under root
+    that it refers to by global name, directly or through each other, and
+    reprs of the plain constants (see _constant_repr) they refer to.
+
+    Returns:
+        List[str]: Sources and '<name> = <repr>' lines, sorted.
+    """
+    parts, seen, pending = set(), set(), [func]
+    while pending:
+        obj = inspect.unwrap(pending.pop())  # e.g. lru_cache wrappers
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        try:
+            parts.add(inspect.getsource(obj))
+        except (OSError, TypeError):
+            parts.add(getattr(obj, '__qualname__', repr(obj)))
+        if inspect.isclass(obj):
+            members = [getattr(m, '__func__', getattr(m, 'fget', m))
+                       for m in vars(obj).values()]
+            codes = [m.__code__ for m in members if inspect.isfunction(m)]
+            namespace = vars(sys.modules[obj.__module__])
+        elif inspect.isfunction(obj):
+            codes, namespace = [obj.__code__], obj.__globals__
+        else:
+            continue
+        for name in sorted(set().union(*map(_code_names, codes))):
+            if name not in namespace:  # builtin or attribute name
+                continue
+            value = namespace[name]
+            # Functions held in a container, e.g. a dict of metrics.
+            values = (list(value.values()) if isinstance(value, dict) else
+                      [value])
+            for dep in values:
+                dep = inspect.unwrap(dep) if callable(dep) else dep
+                if ((inspect.isfunction(dep) or inspect.isclass(dep)) and
+                      _is_project(dep, root)):
+                    pending.append(dep)
+            constant = _constant_repr(value)
+            if constant is not None:
+                # Not prefixed with the module, which is __main__ when run
+                # as a script.
+                parts.add('{0} = {1}'.format(name, constant))
+    return sorted(parts)
+
+
+def code_hash (func):
+    """Hash of the source code of func and of the project code it uses (see
+    code_dependencies).
+    """
+    digest = hashlib.sha256()
+    for part in code_dependencies(func):
+        digest.update(part.encode('utf-8') + b'\0')
+    return digest.hexdigest()
+
+
+class Source:
+    """Input data file, loaded by loader(path)."""
+
+    def __init__ (self, name, path, loader):
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self._hashes = {}  # (mtime, size) -> key
+
+    def key (self):
+        """Hash of the file's contents (computed once per version of it) and
+        of the loader's code, since the loaded DF depends on both.
+        """
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature not in self._hashes:
+            digest = hashlib.sha256()
+            for part in [file_hash(self.path), code_hash(self.loader)]:
+                digest.update(part.encode('utf-8') + b'\0')
+            self._hashes = {signature:digest.hexdigest()}
+        return self._hashes[signature]
+
+    def load (self):
+        return self.loader(self.path)
+
+
+class Stage:
+    """Step of a pipeline computing outputs out of inputs."""
+
+    def __init__ (self, name, func, inputs=(), outputs=None, version=''):
+        """
+        Args:
+            name (str): Name of the stage.
+            func (Callable[..., Union[pd.DataFrame, Tuple[pd.DataFrame]]]):
+            Called with one keyword argument per input; returns one DF per
+            output (a tuple if there are several).
+            inputs (List[str]): Names of sources or outputs of other stages.
+            outputs (List[str]): Names of produced DFs; defaults to [name].
+            version (str): Anything else the outputs depend on that isn't
+            in the code (see code_dependencies), e.g. a package version.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs or [name])
+        self.version = version
+
+    def code_hash (self):
+        """Hash of the source code of func and of the project code it uses
+        (see code_dependencies).
+        """
+        return code_hash(self.func)
+
+    def run (self, frames):
+        """Calls func with input DFs; returns dict of output DFs."""
+        result = self.func(**{name:frames[name] for name in self.inputs})
+        if len(self.outputs) == 1:
+            result = (result,)
+        if len(result) != len(self.outputs):
+            raise ValueError('Stage {0} returned {1} DFs; expected {2}.'
+                             .format(self.name, len(result),
+                                     len(self.outputs)))
+        return dict(zip(self.outputs, result))
+
+
+def write_arrow (df, path):
+    """Writes df to an uncompressed Arrow IPC (Feather) file at path
+    atomically (readers never see a partial file).
+    """
+    import pyarrow.feather
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    pyarrow.feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def read_arrow (path):
+    """Reads DF written by write_arrow, memory-mapping the file: numeric
+    columns without missing values point into the mapped file instead of
+    being copied.
+    """
+    import pyarrow.feather
+
+    table = pyarrow.feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def _run_stage (stage, input_paths, output_paths):
+    """Runs stage in a worker process on inputs mapped from the cache,
+    writing its outputs to the cache.
+
+    Args:
+        stage (Stage): Stage to run.
+        input_paths (Dict[str, str]): Arrow file of each input.
+        output_paths (Dict[str, str]): Arrow file of each output.
+
+    Returns:
+        float: Seconds taken.
+    """
+    start = time.time()
+    frames = {name:read_arrow(path) for name, path in input_paths.items()}
+    for output, df in stage.run(frames).items():
+        write_arrow(df, output_paths[output])
+    return time.time() - start
+
+
+class Pipeline:
+    """Stages and sources forming a DAG, run in dependency order with on-disk
+    caching of every stage's outputs.
+    """
+
+    def __init__ (self, sources, stages, cache_dir, timer=None):
+        """
+        Args:
+            sources (List[Source]): Input files.
+            stages (List[Stage]): Stages, in any order.
+            cache_dir (str): Directory of cached outputs.
+            timer (ProgramTimer): Receives stage timings and cache counts.
+
+        Raises:
+            ValueError if names clash, an input is unknown or stages form a
+            cycle.
+        """
+        self.sources = {source.name:source for source in sources}
+        self.stages = {stage.name:stage for stage in stages}
+        self.cache_dir = cache_dir
+        if timer is None:
+            timer = ProgramTimer(ud_start=True, ud_end=False)
+            timer._start_ud_pre_txt = ''
+        self.timer = timer
+
+        # Output name -> stage producing it.
+        self.producers = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self.producers or output in self.sources:
+                    raise ValueError('{} is produced twice.'.format(output))
+                self.producers[output] = stage
+        for stage in stages:
+            for name in stage.inputs:
+                if name not in self.producers and name not in self.sources:
+                    raise ValueError('Unknown input {0} of stage {1}.'.format(
+                          name, stage.name))
+        self.order = self._topological_order()
+
+    def _topological_order (self):
+        """Stage names such that each stage comes after its inputs' stages."""
+        order, state = [], {}
+
+        def visit (stage):
+            if state.get(stage.name) == 'done':
+                return
+            if state.get(stage.name) == 'visiting':
+                raise ValueError('Cycle through stage {}.'.format(stage.name))
+            state[stage.name] = 'visiting'
+            for name in stage.inputs:
+                if name in self.producers:
+                    visit(self.producers[name])
+            state[stage.name] = 'done'
+            order.append(stage.name)
+
+        for stage in self.stages.values():
+            visit(stage)
+        return order
+
+    def upstream (self, targets):
+        """Names of stages needed for targets (outputs or stage names), in
+        run order.
+        """
+        needed = set()
+        pending = [self.producers.get(t, self.stages.get(t)) for t in targets]
+        while pending:
+            stage = pending.pop()
+            if stage is None or stage.name in needed:
+                continue
+            needed.add(stage.name)
+            pending += [self.producers[name] for name in stage.inputs
+                        if name in self.producers]
+        return [name for name in self.order if name in needed]
+
+    def keys (self):
+        """Cache key of every source and output."""
+        keys = {name:source.key() for name, source in self.sources.items()}
+        for name in self.order:
+            stage = self.stages[name]
+            digest = hashlib.sha256()
+            for part in [stage.name, stage.version, stage.code_hash()]:
+                digest.update(part.encode('utf-8') + b'\0')
+            for input_name in stage.inputs:
+                digest.update('{0}={1}\0'.format(input_name, keys[input_name])
+                              .encode('utf-8'))
+            for output in stage.outputs:
+                keys[output] = hashlib.sha256((digest.hexdigest() + output)
+                                              .encode('utf-8')).hexdigest()
+        return keys
+
+    def cache_path (self, output, key):
+        return os.path.join(self.cache_dir,
+                            '{0}-{1}.arrow'.format(output, key[:16]))
+
+    def is_cached (self, stage, keys):
+        return pyarrow is not None and all(
+              os.path.exists(self.cache_path(output, keys[output]))
+              for output in stage.outputs)
+
+    def _prune (self, name, key):
+        """Removes cached files of name other than the one of key, i.e. of
+        earlier versions of the stage or its inputs.
+        """
+        path = self.cache_path(name, key)
+        for stale_path in glob.glob(os.path.join(self.cache_dir,
+                                                 name + '-*.arrow')):
+            if stale_path != path:
+                os.remove(stale_path)
+
+    def _save (self, output, key, df):
+        if pyarrow is None:
+            return
+        write_arrow(df, self.cache_path(output, key))
+        self._prune(output, key)
+
+    def _source_path (self, name, key):
+        """Returns path of source name's contents in the cache, writing them
+        there if needed (for workers to memory-map).
+        """
+        path = self.cache_path(name, key)
+        if not os.path.exists(path):
+            self.timer.start('Loading {}'.format(name))
+            write_arrow(self.sources[name].load(), path)
+            self._prune(name, key)
+            self.timer.end()
+        return path
+
+    def stale (self, targets=None):
+        """Names of stages (needed for targets) whose outputs aren't cached."""
+        keys = self.keys()
+        names = self.upstream(targets or self.producers)
+        return [name for name in names
+                if not self.is_cached(self.stages[name], keys)]
+
+    def run (self, targets=None, jobs=1):
+        """Computes targets (outputs or stage names; all outputs if None),
+        reading stages' outputs from the cache where they're up to date and
+        recomputing the rest.
+
+        Args:
+            targets (List[str]): Outputs or stage names.
+            jobs (int): Number of processes running stale stages; stages run
+            in this process, one at a time, if 1 (or without pyarrow).
+
+        Returns:
+            Dict[str, pd.DataFrame]: Outputs of the target stages.
+        """
+        targets = list(targets or self.producers)
+        keys = self.keys()
+        names = self.upstream(targets)
+        stale = {name for name in names
+                 if not self.is_cached(self.stages[name], keys)}
+        frames = {}
+
+        def get (name):
+            """Returns source or cached output, reading it if needed."""
+            if name not in frames:
+                if name in self.sources:
+                    self.timer.start('Loading {}'.format(name))
+                    frames[name] = self.sources[name].load()
+                else:
+                    self.timer.start('Reading cached {}'.format(name))
+                    frames[name] = read_arrow(self.cache_path(name,
+                                                              keys[name]))
+                self.timer.end()
+            return frames[name]
+
+        self.timer.start('Running pipeline ({0} of {1} stages stale)'.format(
+              len(stale), len(names)))
+        parallel = jobs > 1 and len(stale) > 1 and pyarrow is not None
+        if parallel:
+            self._run_parallel([name for name in names if name in stale],
+                               keys, jobs)
+        for name in names:
+            if name not in stale:
+                self.timer.increment('Pipeline stages cached')
+                continue
+            if parallel:
+                continue
+            stage = self.stages[name]
+            inputs = {input_name:get(input_name)
+                      for input_name in stage.inputs}
+            self.timer.start('Stage {}'.format(name))
+            outputs = stage.run(inputs)
+            for output, df in outputs.items():
+                self._save(output, keys[output], df)
+            frames.update(outputs)
+            self.timer.end()
+            self.timer.increment('Pipeline stages run')
+        self.timer.end()
+
+        wanted = set(targets)
+        return {output:get(output) for name in names
+                for output in self.stages[name].outputs
+                if output in wanted or name in wanted}
+
+    def _run_parallel (self, names, keys, jobs):
+        """Runs stages names (in run order) on a pool of jobs processes, each
+        as soon as the stages producing its inputs are done.
+        """
+        pending = list(names)
+        waiting = {output for name in names
+                   for output in self.stages[name].outputs}
+        running = {}  # future -> stage name
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            while pending or running:
+                # Submit ready stages in run order.
+                for name in list(pending):
+                    stage = self.stages[name]
+                    if waiting.intersection(stage.inputs):
+                        continue
+                    input_paths = {
+                        input_name:(self._source_path(input_name,
+                                                      keys[input_name])
+                                    if input_name in self.sources else
+                                    self.cache_path(input_name,
+                                                    keys[input_name]))
+                        for input_name in stage.inputs}
+                    output_paths = {output:self.cache_path(output,
+                                                           keys[output])
+                                    for output in stage.outputs}
+                    future = pool.submit(_run_stage, stage, input_paths,
+                                         output_paths)
+                    running[future] = name
+                    pending.remove(name)
+
+                done, _ = concurrent.futures.wait(
+                      running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in sorted(done, key=lambda f: running[f]):
+                    name = running.pop(future)
+                    seconds = future.result()  # re-raises stage's error
+                    for output in self.stages[name].outputs:
+                        self._prune(output, keys[output])
+                        waiting.discard(output)
+                    self.timer.record('Stage {}'.format(name), seconds)
+                    self.timer.increment('Pipeline stages run')
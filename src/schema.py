@@ -0,0 +1,83 @@
+"""
+Schema
+------
+Declared column types of the NYC inspections CSV, so that it's read without
+type inference: labels repeated across thousands of rows are stored as
+categoricals, ZIPCODE and SCORE as nullable ints and the date columns as
+datetime64.
+"""
+
+import pandas as pd
+
+from dates import parse_date_columns
+
+# dtypes passed to read_csv. Date columns are read as str and parsed after.
+INSPECTIONS_DTYPES = {
+    'CAMIS':'int64',
+    'DBA':str,
+    'BORO':'category',
+    'BUILDING':str,
+    'STREET':str,
+    'ZIPCODE':'Int64',
+    'PHONE':str,
+    'CUISINE.DESCRIPTION':'category',
+    'INSPECTION.DATE':str,
+    'ACTION':'category',
+    'VIOLATION.CODE':'category',
+    'VIOLATION.DESCRIPTION':'category',
+    'CRITICAL.FLAG':'category',
+    'SCORE':'Int64',
+    'GRADE':'category',
+    'GRADE.DATE':str,
+    'RECORD.DATE':str,
+    'INSPECTION.TYPE':'category',
+    }
+
+INSPECTIONS_DATE_COLUMNS = ['INSPECTION.DATE', 'GRADE.DATE', 'RECORD.DATE']
+
+
+def _parse_date_columns (df):
+    parse_date_columns(df, INSPECTIONS_DATE_COLUMNS)
+    return df
+
+
+def read_inspections (url, **kwargs):
+    """Reads NYC inspections CSV with the declared schema.
+
+    Args:
+        url (str): Path of inspections CSV.
+        **kwargs: Passed on to pd.read_csv.
+    """
+    return _parse_date_columns(
+          pd.read_csv(url, dtype=INSPECTIONS_DTYPES, **kwargs))
+
+
+def iter_inspections (url, chunksize, **kwargs):
+    """Yields DFs of up to chunksize rows of NYC inspections CSV, read with
+    the declared schema.
+
+    Categories of categorical columns are those seen in each chunk, so they
+    can differ between chunks.
+    """
+    with pd.read_csv(url, dtype=INSPECTIONS_DTYPES, chunksize=chunksize,
+                     **kwargs) as reader:
+        for chunk in reader:
+            yield _parse_date_columns(chunk)
+
+
+def memory_report (before, after):
+    """Compares resident memory of two versions of the same DF.
+
+    Returns:
+        pd.DataFrame: dtype and MB per column before and after, plus a Total
+        row.
+    """
+    report = pd.DataFrame({
+        'dtype_before':before.dtypes.astype(str),
+        'mb_before':before.memory_usage(deep=True, index=False)/1e6,
+        'dtype_after':after.dtypes.astype(str),
+        'mb_after':after.memory_usage(deep=True, index=False)/1e6,
+        })
+    report.loc['Total'] = ['', report['mb_before'].sum(), '',
+                           report['mb_after'].sum()]
+    return report.round(2)
@@ -0,0 +1,186 @@
+"""
+Name Similarity
+---------------
+String similarity of restaurant names in the inspections data (DBA) and the
+Yelp data, e.g. the model's restaurant_name_sim feature.
+
+pair_similarity() computes a metric for Series of pairs, evaluating each
+distinct pair once (inspections repeat the same DBA/Yelp name pair for every
+inspection of a restaurant), memoizing results across calls, and optionally
+spreading the distinct pairs over worker processes.
+
+Metrics
+-------
+levenshtein:
+    Edit distance (same as distance.levenshtein() used in the data_prep
+    notebook).
+levenshtein_ratio:
+    1 - edit distance / length of longer name, in [0, 1].
+token_set_ratio:
+    levenshtein_ratio of names' sorted token sets, ignoring word order and
+    repeated words, in [0, 1].
+jaro_winkler:
+    Jaro-Winkler similarity, in [0, 1].
+"""
+
+import concurrent.futures
+import functools
+import re
+
+import numpy as np
+import pandas as pd
+
+# Pairs sent to a worker process at a time by pair_similarity().
+CHUNK_SIZE = 2000
+
+MEMO_SIZE = 1 << 18
+
+
+def normalize_name (name):
+    """Upper-cases name, drops apostrophes (as addresses.canonical_address
+    does), replaces other punctuation with spaces and collapses whitespace,
+    e.g. "Joe's  Pizza, Inc." -> 'JOES PIZZA INC'.
+    """
+    text = re.sub("['\u2019]", '', str(name).upper())
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def levenshtein (a, b):
+    """Edit distance (insertions, deletions, substitutions) between str."""
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def levenshtein_ratio (a, b):
+    """1 - levenshtein(a, b) / length of longer str; 1.0 for two empty str."""
+    longest = max(len(a), len(b))
+    if not longest:
+        return 1.0
+    return 1.0 - levenshtein(a, b)/longest
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def token_set_ratio (a, b):
+    """Similarity of normalized names' token sets: the best levenshtein_ratio
+    between their sorted common tokens and each name's common plus remaining
+    tokens (as in fuzzywuzzy's token_set_ratio, scaled to [0, 1]).
+    """
+    tokens_a = set(normalize_name(a).split())
+    tokens_b = set(normalize_name(b).split())
+    common = ' '.join(sorted(tokens_a & tokens_b))
+    with_a = ' '.join(filter(None, [common,
+                                    ' '.join(sorted(tokens_a - tokens_b))]))
+    with_b = ' '.join(filter(None, [common,
+                                    ' '.join(sorted(tokens_b - tokens_a))]))
+    ratios = [levenshtein_ratio(with_a, with_b)]
+    if common:
+        ratios += [levenshtein_ratio(common, with_a),
+                   levenshtein_ratio(common, with_b)]
+    return max(ratios)
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def jaro_winkler (a, b, prefix_scale=0.1):
+    """Jaro-Winkler similarity: Jaro similarity boosted by the length (up to
+    4) of the common prefix.
+    """
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+
+    window = max(max(len(a), len(b))//2 - 1, 0)
+    matched_a = [False]*len(a)
+    matched_b = [False]*len(b)
+    matches = 0
+    for i, ca in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not matched_b[j] and b[j] == ca:
+                matched_a[i] = matched_b[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    chars_a = [c for c, m in zip(a, matched_a) if m]
+    chars_b = [c for c, m in zip(b, matched_b) if m]
+    transpositions = sum(ca != cb for ca, cb in zip(chars_a, chars_b))//2
+    jaro = (matches/len(a) + matches/len(b) +
+            (matches - transpositions)/matches)/3
+
+    prefix = 0
+    for ca, cb in zip(a[:4], b[:4]):
+        if ca != cb:
+            break
+        prefix += 1
+    return jaro + prefix*prefix_scale*(1 - jaro)
+
+
+METRICS = {
+    'levenshtein':levenshtein,
+    'levenshtein_ratio':levenshtein_ratio,
+    'token_set_ratio':token_set_ratio,
+    'jaro_winkler':jaro_winkler,
+    }
+
+
+def _score_pairs (metric, pairs):
+    """Applies metric to list of (a, b) pairs."""
+    func = METRICS[metric]
+    return [func(a, b) for a, b in pairs]
+
+
+def pair_similarity (left, right, metric='levenshtein', normalize=False,
+                     workers=1):
+    """Computes metric between names in left and right, row by row.
+
+    Args:
+        left (pd.Series): Names, e.g. DBA.
+        right (pd.Series): Names to compare to, e.g. Yelp name; same length
+        as left.
+        metric (str): Key of METRICS.
+        normalize (bool): If True, compares normalize_name() of names.
+        workers (int): Number of processes to compute distinct pairs with;
+        1 computes them in this process (and memoizes them across calls).
+
+    Returns:
+        pd.Series: float similarities with same index as left; NaN where a
+        name is missing.
+    """
+    if metric not in METRICS:
+        raise ValueError('Unknown metric {0}; expected one of {1}.'.format(
+              metric, sorted(METRICS)))
+
+    missing = (left.isnull().to_numpy() | right.isnull().to_numpy())
+    pairs = pd.MultiIndex.from_arrays([left.to_numpy()[~missing],
+                                       right.to_numpy()[~missing]])
+    codes, uniques = pd.factorize(pairs)
+    unique_pairs = [(str(a), str(b)) for a, b in uniques]
+    if normalize:
+        unique_pairs = [(normalize_name(a), normalize_name(b))
+                        for a, b in unique_pairs]
+
+    if workers > 1 and len(unique_pairs) > CHUNK_SIZE:
+        chunks = [unique_pairs[i:i + CHUNK_SIZE]
+                  for i in range(0, len(unique_pairs), CHUNK_SIZE)]
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            scores = [score for chunk_scores in executor.map(
+                            functools.partial(_score_pairs, metric), chunks)
+                      for score in chunk_scores]
+    else:
+        scores = _score_pairs(metric, unique_pairs)
+
+    result = np.full(len(missing), np.nan)
+    result[~missing] = np.asarray(scores, dtype=float)[codes]
+    return pd.Series(result, index=left.index)
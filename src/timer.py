@@ -5,7 +5,7 @@ Catch-all execution log to track program process and timing.
 """
 
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List
 from pandas import DataFrame
 
 
@@ -31,9 +31,16 @@ class Event:
         self.__start = time.time()
         self.__end = None
 
-    def end (self):
-        """ Sets end time for event. """
-        self.__end = time.time()
+    def end (self, seconds: float = None):
+        """
+        Sets end time for event.
+        :param  seconds: If provided, the event is ended as having lasted this long
+                (e.g. when it was timed elsewhere).
+        """
+        if seconds is None:
+            self.__end = time.time()
+        else:
+            self.__end = self.__start + seconds
 
     def is_open (self) -> bool:
         """ Returns True if the event has not been terminated. """
@@ -72,6 +79,8 @@ class ProgramTimer:
         If True, then update will be printed when event is closed.
     _default_header: str
         Appears as header when summary is printed.
+    counters: Dict[str, int]
+        Named tallies (e.g. cache hits) reported alongside event timings.
     """
 
     def __init__ (
@@ -94,9 +103,10 @@ class ProgramTimer:
         self._end_ud_post_txt = '.'
         self._end_ud_pre_txt = 'Finished: '
 
-        # DF this class uses to err_log errors.
-        self.errors = DataFrame(
-              columns=['Method', 'DataID', 'ErrDescription'])  # type: DataFrame
+        # Logged errors; only turned into a DF when the errors property is read,
+        # so logging many errors stays linear.
+        self._errors = []  # type: List[Dict[str, Any]]
+        self.counters = {}  # type: Dict[str, int]
 
     def start (self, name: str):
         new_id = self.__event_count + 1
@@ -126,6 +136,20 @@ class ProgramTimer:
                   self._end_ud_post_txt
             print(msg)
 
+    def record (self, name: str, seconds: float):
+        """
+        Adds a finished event that lasted given seconds, nested under the current open
+        event; e.g. for work timed in another process.
+        """
+        prior_open_id = self.__prior_open_event_id()
+        hrchy = 1 if prior_open_id is None else \
+              self._events[prior_open_id].hrchy + 1
+        event = Event(name, self.__event_count + 1, hrchy, prior_open_id)
+        event.end(seconds)
+        self._events[event.uid] = event
+        if self._ud_end:
+            print(self._end_ud_pre_txt + name + self._end_ud_post_txt)
+
     def __prior_open_event_id (self):
         """
         Returns uid of the closest prior Event that is still open; None if there are no
@@ -145,9 +169,10 @@ class ProgramTimer:
 
     def print_summary (self, header: str = None):
         """
-        Prints two sections:
-        (a) summary of events with spaces to indicate hierarchy and
-        (b) the DF storing exceptions.
+        Prints up to three sections:
+        (a) summary of events with spaces to indicate hierarchy,
+        (b) counters and
+        (c) the DF storing exceptions.
         :param  header: First line of execution summary; overrides default if provided.
         """
         # Build main program execution section.
@@ -161,6 +186,13 @@ class ProgramTimer:
             event_details = self.__create_event_summary(self._events[i])
             summary = summary + event_details + '\n'
 
+        # Add separate Counters section only if anything was counted.
+        if self.counters:
+            summary += '{0}{1}'.format(SECTION_DIVIDE, '\n')
+            summary += 'Counters\n\n'
+            for name, count in self.counters.items():
+                summary += '{0}: {1}\n'.format(name, count)
+
         # Add separate Exceptions section only if errors were encountered.
         if self.errors_were_logged:
             summary += '{0}{1}'.format(SECTION_DIVIDE, '\n')
@@ -169,6 +201,7 @@ class ProgramTimer:
 
         summary += '\n{}\n'.format(SECTION_DIVIDE)
         self._events = {}
+        self.counters = {}
         print(summary)
 
     @staticmethod
@@ -179,10 +212,20 @@ class ProgramTimer:
         summary += ': ' + '{0:.1f}'.format(event.seconds()) + 's'
         return summary
 
+    def increment (self, name: str, n: int = 1):
+        """ Adds n to the named counter, which is reported by print_summary(). """
+        self.counters[name] = self.counters.get(name, 0) + n
+
     def log_err (self, method: str, data_id: Any, info: str):
         new_err = {'Method':method, 'DataID':data_id, 'ErrDescription':info}
-        self.errors = self.errors.append(new_err, ignore_index=True)
+        self._errors.append(new_err)
+
+    @property
+    def errors (self) -> DataFrame:
+        """ DF of logged errors. """
+        return DataFrame(self._errors,
+                         columns=['Method', 'DataID', 'ErrDescription'])
 
     @property
     def errors_were_logged (self) -> bool:
-        return not self.errors.empty
+        return bool(self._errors)
@@ -8,14 +8,23 @@ result from the search query.
 Based on Yelp Fusion API code sample.
 API documentation: https://www.yelp.com/developers/documentation/v3/get_started
 """
+import datetime
 import functools
+import json
+import os
 import pprint
+import sqlite3
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.error import HTTPError
 from urllib.parse import quote, urlencode
 
 import requests
 
+from paths import DATA_DIR
+
 # OAuth credentials.
 CLIENT_ID = ""
 SECRET = ""
@@ -29,6 +38,23 @@ GRANT_TYPE = 'client_credentials'
 
 # Query constants.
 SEARCH_LIMIT = 1
+MAX_WORKERS = 8  # default number of concurrent requests for batch queries.
+
+# Rate limits.
+QUERIES_PER_SECOND = 5
+QUERIES_PER_DAY = 25000
+MAX_RETRIES = 5  # retries of a request rejected with 429 Too Many Requests.
+# Daily usage saved across restarts.
+PATH_QUOTA = os.path.join(DATA_DIR, 'yelp_quota.json')
+
+# Response cache.
+PATH_CACHE = os.path.join(DATA_DIR, 'yelp_cache.sqlite')
+CACHE_TTL = 30*24*60*60  # seconds a cached response stays valid.
+CACHE_MAX_ENTRIES = 200000
+
+
+class DailyQuotaExceeded (RuntimeError):
+    """Raised when the daily request quota has been used up."""
 
 
 @functools.lru_cache(maxsize=100, typed=False)
@@ -60,6 +86,359 @@ def obtain_bearer_token (host, path):
     return response.json()['access_token']
 
 
+class RateLimiter:
+    """Token-bucket scheduler enforcing per-second and per-day request quotas.
+
+    Requests over the per-second rate wait for a token; requests over the daily
+    quota raise DailyQuotaExceeded. Daily usage is saved to a JSON file after
+    every request so that restarting the process doesn't reset it. Safe to
+    share between threads.
+    """
+
+    def __init__ (self, per_second=QUERIES_PER_SECOND, per_day=QUERIES_PER_DAY,
+                  path=PATH_QUOTA):
+        """
+        Args:
+            per_second (float): Sustained requests per second (bucket size).
+            per_day (int): Requests allowed per UTC day.
+            path (str): JSON file to persist daily usage; None keeps it in
+            memory only.
+        """
+        self.per_second = per_second
+        self.per_day = per_day
+        self.path = path
+        self._lock = threading.Lock()
+        self._tokens = float(per_second)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._day, self._used = self._load_usage()
+
+    @staticmethod
+    def _today ():
+        return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+    def _load_usage (self):
+        today = self._today()
+        if self.path is None or not os.path.exists(self.path):
+            return today, 0
+        with open(self.path, 'r') as f:
+            usage = json.load(f)
+        if usage['date'] != today:
+            return today, 0
+        return today, usage['used']
+
+    def _save_usage (self):
+        if self.path is None:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'date':self._day, 'used':self._used}, f)
+        os.replace(tmp_path, self.path)
+
+    def _roll_day (self):
+        today = self._today()
+        if today != self._day:
+            self._day, self._used = today, 0
+
+    @property
+    def remaining_today (self):
+        """Number of requests left in today's quota."""
+        with self._lock:
+            self._roll_day()
+            return max(self.per_day - self._used, 0)
+
+    def acquire (self):
+        """Blocks until a request may be sent and records it against quotas.
+        Waiting is done without holding the lock, so other threads can keep
+        checking quotas (or pause the limiter) meanwhile.
+
+        Raises:
+            DailyQuotaExceeded: The daily quota has been used up.
+        """
+        while True:
+            with self._lock:
+                self._roll_day()
+                if self._used >= self.per_day:
+                    raise DailyQuotaExceeded(
+                          'Used all {} requests for {}.'.format(self.per_day,
+                                                                self._day))
+                now = time.monotonic()
+                self._tokens = min(float(self.per_second), self._tokens + (
+                      now - self._refilled)*self.per_second)
+                self._refilled = now
+                wait = max(self._paused_until - now,
+                           (1 - self._tokens)/self.per_second)
+                if wait <= 0:
+                    self._tokens -= 1
+                    self._used += 1
+                    self._save_usage()
+                    return
+            time.sleep(wait)
+
+    def refund (self):
+        """Takes back a request from today's usage, e.g. one the API rejected
+        with 429 Too Many Requests, which doesn't count towards its quota.
+        """
+        with self._lock:
+            self._roll_day()
+            self._used = max(self._used - 1, 0)
+            self._save_usage()
+
+    def pause (self, seconds):
+        """Holds back all requests for the given number of seconds, e.g. after
+        a 429 response.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until,
+                                     time.monotonic() + seconds)
+
+    def exhaust (self):
+        """Marks today's quota as used up, e.g. when the API says so."""
+        with self._lock:
+            self._roll_day()
+            self._used = max(self._used, self.per_day)
+            self._save_usage()
+
+
+@functools.lru_cache(maxsize=1)
+def get_rate_limiter ():
+    """Returns the shared RateLimiter for the Yelp API, created on first use."""
+    return RateLimiter()
+
+
+class ResponseCache:
+    """Persistent cache of API responses in a SQLite database, keyed by host,
+    path and query parameters (i.e. endpoint, term, location and sort_by for
+    searches, or business id for business lookups).
+
+    Entries older than ttl are treated as misses; once there are more than
+    max_entries, the least recently used are evicted. Hits and misses are
+    counted on the attached ProgramTimer, if any. Safe to share between
+    threads.
+    """
+
+    def __init__ (self, path=PATH_CACHE, ttl=CACHE_TTL,
+                  max_entries=CACHE_MAX_ENTRIES, timer=None):
+        """
+        Args:
+            path (str): SQLite database file; ':memory:' for a temporary cache.
+            ttl (float): Seconds a cached response stays valid.
+            max_entries (int): Maximum number of responses kept.
+            timer (ProgramTimer): Receives 'Yelp cache hits' and
+            'Yelp cache misses' counts.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                  'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, '
+                  'response TEXT NOT NULL, created REAL NOT NULL, '
+                  'accessed REAL NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                               'ON responses (accessed)')
+        self._size = self._conn.execute(
+              'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def make_key (host, path, url_params=None):
+        """Returns cache key for a GET request."""
+        return json.dumps([host, path, sorted((url_params or {}).items())])
+
+    def _count (self, name):
+        if self.timer is not None:
+            self.timer.increment('Yelp cache ' + name)
+
+    def get (self, key):
+        """Returns cached response for key, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                  'SELECT response, created FROM responses WHERE key = ?',
+                  (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                with self._conn:
+                    self._conn.execute('DELETE FROM responses WHERE key = ?',
+                                       (key,))
+                self._size -= 1
+                row = None
+            if row is None:
+                self.misses += 1
+                self._count('misses')
+                return None
+            with self._conn:
+                self._conn.execute(
+                      'UPDATE responses SET accessed = ? WHERE key = ?',
+                      (now, key))
+            self.hits += 1
+            self._count('hits')
+        return json.loads(row[0])
+
+    def put (self, key, response):
+        """Saves response for key, evicting least recently used entries if the
+        cache is full.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            replaced = self._conn.execute(
+                  'SELECT 1 FROM responses WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                  'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                  (key, json.dumps(response), now, now))
+            if replaced is None:
+                self._size += 1
+            excess = self._size - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                      'DELETE FROM responses WHERE key IN (SELECT key FROM '
+                      'responses ORDER BY accessed LIMIT ?)', (excess,))
+                self._size -= excess
+
+    def close (self):
+        self._conn.close()
+
+
+@functools.lru_cache(maxsize=1)
+def get_response_cache ():
+    """Returns the shared ResponseCache for the Yelp API, created on first
+    use.
+    """
+    return ResponseCache()
+
+
+def _retry_after (response, attempt):
+    """Seconds to wait before retrying a 429 response: the Retry-After header
+    if given in seconds, else exponential backoff.
+    """
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return 2**attempt
+
+
+class YelpClient:
+    """Keep-alive connection to the API that reuses TCP/TLS connections across
+    requests and holds the bearer token as a default header. Responses found
+    in the client's cache are returned without a network call.
+
+    Safe to share between threads; up to pool_size connections are kept open.
+    """
+
+    def __init__ (self, host=None, bearer_token=None, pool_size=MAX_WORKERS,
+                  rate_limiter=None, cache=None):
+        """
+        Args:
+            host (str): The domain host of the API; defaults to API_HOST.
+            bearer_token (str): OAuth bearer token; obtained on first request
+            if not supplied.
+            pool_size (int): Maximum number of connections kept open.
+            rate_limiter (RateLimiter): Scheduler every request goes through;
+            None sends requests unthrottled.
+            cache (ResponseCache): Cache of successful responses; None
+            disables caching.
+        """
+        self.host = host or API_HOST
+        self._bearer_token = bearer_token
+        self._token_lock = threading.Lock()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if bearer_token is not None:
+            self._set_auth_header(bearer_token)
+
+    def _set_auth_header (self, bearer_token):
+        self.session.headers['Authorization'] = 'Bearer %s'%bearer_token
+
+    @property
+    def bearer_token (self):
+        """OAuth bearer token, obtained on first use (once, even if several
+        threads ask for it at the same time).
+        """
+        with self._token_lock:
+            if self._bearer_token is None:
+                self._bearer_token = obtain_bearer_token(self.host, TOKEN_PATH)
+                self._set_auth_header(self._bearer_token)
+        return self._bearer_token
+
+    def request (self, path, url_params=None, bearer_token=None):
+        """Send a GET request to the API over the pooled session.
+
+        Args:
+            path (str): The path of the API after the domain.
+            url_params (dict): An optional set of query parameters.
+            bearer_token (str): Overrides the client's token for this request.
+
+        Returns:
+            dict: The JSON response from the request.
+
+        Raises:
+            DailyQuotaExceeded: The rate limiter's daily quota is used up.
+            requests.HTTPError: Still rate limited after MAX_RETRIES retries.
+        """
+        url_params = url_params or {}
+        if self.cache is not None:
+            key = self.cache.make_key(self.host, path, url_params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        url = '{0}{1}'.format(self.host, quote(path.encode('utf8')))
+        headers = None
+        if bearer_token is None:
+            self.bearer_token  # ensure default Authorization header is set
+        else:
+            headers = {'Authorization':'Bearer %s'%bearer_token}
+
+        for attempt in range(MAX_RETRIES + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            response = self.session.get(url, headers=headers, params=url_params)
+            if response.status_code != 429:
+                data = response.json()
+                if self.cache is not None and response.status_code == 200:
+                    self.cache.put(key, data)
+                return data
+            if self.rate_limiter is not None:
+                if 'ACCESS_LIMIT_REACHED' in response.text:
+                    self.rate_limiter.exhaust()
+                    raise DailyQuotaExceeded(response.text)
+                self.rate_limiter.refund()
+            if attempt == MAX_RETRIES:
+                break  # no retry left to wait for
+            if self.rate_limiter is not None:
+                self.rate_limiter.pause(_retry_after(response, attempt))
+            else:
+                time.sleep(_retry_after(response, attempt))
+        response.raise_for_status()
+
+    def close (self):
+        self.session.close()
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, *args):
+        self.close()
+
+
+@functools.lru_cache(maxsize=100, typed=False)
+def get_client (host):
+    """Returns the shared, rate-limited and cached YelpClient for host,
+    created on first use.
+    """
+    return YelpClient(host, rate_limiter=get_rate_limiter(),
+                      cache=get_response_cache())
+
+
 def request (host, path, bearer_token, url_params=None):
     """Given a bearer token, send a GET request to the API.
 
@@ -76,20 +455,18 @@ def request (host, path, bearer_token, url_params=None):
     Raises:
         HTTPError: An error occurs from the HTTP request.
     """
-    url_params = url_params or {}
-    url = '{0}{1}'.format(host, quote(path.encode('utf8')))
-    headers = {'Authorization':'Bearer %s'%bearer_token}
-    response = requests.request('GET', url, headers=headers, params=url_params)
-    return response.json()
+    return get_client(host).request(path, url_params, bearer_token)
 
 
-def search (token, term, location, sort_by='distance'):
+def search (token, term, location, sort_by='distance', client=None):
     """Query the Search API by a search term and location.
 
     Args:
+        token (str): OAuth bearer token; None uses the client's token.
         term (str): The search term passed to the API.
         location (str): The search location passed to the API.
         sort_by (str): How to filter search results.
+        client (YelpClient): Connection to use; defaults to shared client.
 
     Returns:
         dict: The JSON response from the request.
@@ -111,37 +488,39 @@ def search (token, term, location, sort_by='distance'):
         'limit':SEARCH_LIMIT,
         'sort_by':sort_by
         }
-    return request(API_HOST, SEARCH_PATH, token, url_params=url_params)
+    client = client or get_client(API_HOST)
+    return client.request(SEARCH_PATH, url_params, token)
 
 
-def get_business (business_id, token=None):
+def get_business (business_id, token=None, client=None):
     """Query the Business API by a business ID.
 
     Args:
         business_id (str): The ID of the business to query.
+        token (str): OAuth bearer token; None uses the client's token.
+        client (YelpClient): Connection to use; defaults to shared client.
 
     Returns:
         dict: The JSON response from the request.
     """
-    if token is None:
-        token = obtain_bearer_token(API_HOST, TOKEN_PATH)
+    client = client or get_client(API_HOST)
     business_path = BUSINESS_PATH + business_id
-    return request(API_HOST, business_path, token)
+    return client.request(business_path, bearer_token=token)
 
 
-def get_business_match (term, location, sort_by='distance'):
+def get_business_match (term, location, sort_by='distance', client=None):
     """Queries API for best match among businesses.
 
     Args:
         term (str): The search term to query.
         location (str): The location of the business to query.
         sort_by (str): How to filter search results.
+        client (YelpClient): Connection to use; defaults to shared client.
 
     Returns:
         dict: The first JSON response from the request.
     """
-    bearer_token = obtain_bearer_token(API_HOST, TOKEN_PATH)
-    response = search(bearer_token, term, location, sort_by)
+    response = search(None, term, location, sort_by, client)
     businesses = response.get('businesses')
 
     if not businesses:
@@ -150,6 +529,35 @@ def get_business_match (term, location, sort_by='distance'):
     return businesses[0]
 
 
+def get_business_matches (queries, sort_by='distance', workers=MAX_WORKERS,
+                          client=None):
+    """Queries API for best match of each (term, location) pair, keeping up to
+    workers requests in flight at once.
+
+    Args:
+        queries (Iterable[Tuple[str, str]]): Search terms and locations.
+        sort_by (str): How to filter search results.
+        workers (int): Number of concurrent requests; 1 queries serially.
+        client (YelpClient): Connection to use; defaults to shared client.
+
+    Returns:
+        List[dict]: Best-matching business JSON (or None) per query, in the
+        same order as queries.
+
+    Raises:
+        HTTPError: An error occurs from any of the HTTP requests.
+    """
+    client = client or get_client(API_HOST)
+
+    def match (query):
+        return get_business_match(query[0], query[1], sort_by, client)
+
+    if workers <= 1:
+        return [match(query) for query in queries]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(match, queries))
+
+
 def demo ():
     """Demo use of module for a single restaurant."""
     search_term = "KOITO JAPANESE RESTAURANT"
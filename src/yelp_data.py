@@ -0,0 +1,197 @@
+"""
+Yelp Business Data
+------------------
+Creates the Yelp business DataFrame (yelp_data.csv) out of the business JSON
+saved by data_prep.update_yelp_data (yelp_data.txt).
+"""
+
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from paths import DATA_DIR
+from timer import ProgramTimer
+
+log = ProgramTimer(ud_start=True, ud_end=False)
+log._start_ud_pre_txt = ''
+
+PATH_YELP_JSON = os.path.join(DATA_DIR, 'yelp_data.txt')
+PATH_YELP_DATA = os.path.join(DATA_DIR, 'yelp_data.csv')
+PATH_ERROR_LOG = os.path.join(DATA_DIR, 'error_log.csv')
+
+# Columns of the Yelp business DataFrame, in order.
+YELP_COLUMNS = ['id', 'name', 'url', 'phone', 'latitude', 'longitude',
+                'review_count', 'price', 'rating', 'transactions',
+                'categories', 'address', 'city', 'state', 'zip_code']
+
+# Number of businesses read from JSON and converted to a DF at a time.
+BATCH_SIZE = 10000
+
+
+#####################################################################
+# Reading JSON.
+
+def iter_yelp_data (url):
+    """Yields Yelp business JSON saved on local computer at given url, one
+    business (line) at a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(url, 'r', encoding='utf-8') as src:
+        for line in src:
+            obj, idx = decoder.raw_decode(line)
+            yield obj
+
+
+def iter_yelp_data_batches (url, batch_size=BATCH_SIZE):
+    """Yields lists of up to batch_size businesses from Yelp JSON saved at
+    given url.
+    """
+    businesses = iter_yelp_data(url)
+    while True:
+        batch = list(itertools.islice(businesses, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def load_yelp_data (url):
+    """Loads Yelp data saved on local computer at given url."""
+    return list(iter_yelp_data(url))
+
+
+#####################################################################
+# Creating a DataFrame out of the Yelp business JSON data.
+
+def _get_categories (row):
+    """Returns list of aliases from categories entry."""
+    result = []
+    try:
+        for category in row['categories']:
+            result.append(category['alias'])
+    except:
+        log.log_err('_get_categories', row['id'], 'categories')
+        return np.nan
+    if not result:
+        return np.nan
+    return result
+
+
+def _get_transactions (row):
+    transactions = row['transactions']
+    if not transactions:
+        return np.nan
+    return transactions
+
+
+def _get_item (row, fld):
+    """Encapsulate retrieving item from JSON so that an NaN can be returned
+    when that field is not present.
+    """
+    try:
+        return row[fld]
+    except KeyError:
+        log.log_err('_get_item', row['id'], fld)
+        return np.nan
+
+
+def _get_price (row):
+    try:
+        return row['price'].count('$')
+    except KeyError:
+        log.log_err('_get_price', row['id'], 'price')
+
+
+def _get_coord (row, coord):
+    try:
+        return float(row['coordinates'][coord])
+    except:
+        log.log_err('_get_coord', row['id'], coord)
+        return np.nan
+
+
+def _create_df_entry_from_json (row):
+    """Creates row to be appended onto DataFrame."""
+    new_row = {'id':row['id'],
+               'name':row['name'],
+               'url':_get_item(row, 'url'),
+               'phone':_get_item(row, 'phone'),
+               'latitude':_get_coord(row, 'latitude'),
+               'longitude':_get_coord(row, 'longitude'),
+               'review_count':int(row['review_count']),
+               'price':_get_price(row),
+               'rating':float(row['rating']),
+               'transactions':_get_transactions(row),
+               'categories':_get_categories(row),
+               'address':row['location']['address1'],
+               'city':row['location']['city'],
+               'state':row['location']['state'],
+               'zip_code':row['location']['zip_code']
+               }
+    return new_row
+
+
+def build_yelp_df (json_data):
+    """Creates DataFrame (indexed by id) out of Yelp business JSON.
+
+    Rows are collected in one list per column and the DataFrame is built once
+    at the end, so time is linear in the number of businesses. Businesses
+    whose name or id can't be encoded in ISO-8859-1 are skipped and logged.
+
+    Args:
+        json_data (Iterable[dict]): Business JSON, e.g. from iter_yelp_data().
+
+    Returns:
+        pd.DataFrame: One object column per entry of YELP_COLUMNS but id.
+    """
+    columns = {col:[] for col in YELP_COLUMNS}
+
+    for row in json_data:
+        new_row = _create_df_entry_from_json(row)
+        try:
+            new_row['name'].encode('ISO-8859-1')
+            new_row['id'].encode('ISO-8859-1')
+        except:
+            log.log_err('Creating row', 'na', 'name or id not encodable.')
+            continue
+        for col, values in columns.items():
+            values.append(new_row[col])
+
+    df = pd.DataFrame({col:pd.Series(values, dtype=object)
+                       for col, values in columns.items()},
+                      columns=YELP_COLUMNS)
+    df.set_index('id', inplace=True, drop=True)
+    return df
+
+
+def create_yelp_data_df (batch_size=BATCH_SIZE, json_url=PATH_YELP_JSON,
+                         url=PATH_YELP_DATA, error_url=PATH_ERROR_LOG):
+    """Saves DataFrame made out of Yelp business JSON and error log.
+
+    The JSON is streamed and written to csv batch_size businesses at a time,
+    so memory use doesn't grow with the size of the JSON file. The csv is
+    written to a temporary file and moved into place once complete, so an
+    error partway through leaves the previous yelp_data.csv intact.
+
+    Args:
+        batch_size (int): Number of businesses converted at a time.
+        json_url (str): Yelp business JSON, one business per line.
+        url (str): Path of the csv.
+        error_url (str): Path of the error log.
+    """
+    tmp_url = url + '.tmp'
+    try:
+        with open(tmp_url, 'w', encoding='ISO-8859-1', newline='') as f:
+            header = True
+            for batch in iter_yelp_data_batches(json_url, batch_size):
+                build_yelp_df(batch).to_csv(f, header=header)
+                header = False
+            if header:  # no businesses; still write the header.
+                build_yelp_df([]).to_csv(f)
+        os.replace(tmp_url, url)
+    finally:
+        if os.path.exists(tmp_url):
+            os.remove(tmp_url)
+    log.errors.to_csv(error_url)
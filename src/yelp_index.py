@@ -0,0 +1,144 @@
+"""
+Yelp Index
+----------
+Offline blocking index over Yelp business JSON already pulled from the API
+(yelp_data.txt), so that restaurants can be matched to a known business
+without spending a query of the daily quota.
+
+Candidates are blocked by zip code, then by canonical address (see
+addresses.canonical_address); among them the business whose name shares the
+most character trigrams with the restaurant's name wins, if similar enough.
+A restaurant with no candidate at its address only matches a business in its
+zip code with a near-identical name.
+
+resolve_matches() looks queries up locally first and sends only misses to the
+API.
+"""
+
+import collections
+
+from addresses import canonical_address
+from similarity import normalize_name
+import yelp
+
+# Minimum trigram (Jaccard) similarity of names at the same address.
+MIN_NAME_SIMILARITY = 0.5
+
+# Minimum trigram similarity of names in the same zip code but at different
+# (or missing) addresses.
+MIN_NAME_SIMILARITY_ZIP = 0.9
+
+
+def name_trigrams (name):
+    """Set of character trigrams of normalized name, padded with spaces."""
+    text = ' {} '.format(normalize_name(name))
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def _jaccard (a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b)/len(a | b)
+
+
+def _zip5 (zip_code):
+    """First 5 characters of zip code as str ('' if missing)."""
+    if zip_code is None or zip_code != zip_code:  # None or NaN
+        return ''
+    if isinstance(zip_code, float):
+        zip_code = int(zip_code)
+    return str(zip_code).strip()[:5]
+
+
+class YelpIndex:
+    """Business JSON blocked by zip code and canonical address.
+
+    Attributes
+    ----------
+    businesses: Dict[str, dict]
+        Indexed business JSON, by id.
+    """
+
+    def __init__ (self, businesses=()):
+        """
+        Args:
+            businesses (Iterable[dict]): Yelp business JSON, e.g. from
+            yelp_data.iter_yelp_data().
+        """
+        self.businesses = {}
+        # zip -> canonical address -> ids; zip -> ids.
+        self._by_address = collections.defaultdict(
+              lambda: collections.defaultdict(list))
+        self._by_zip = collections.defaultdict(list)
+        self._trigrams = {}
+        self.add(businesses)
+
+    def __len__ (self):
+        return len(self.businesses)
+
+    def add (self, businesses):
+        """Indexes business JSON; businesses already indexed are skipped."""
+        for biz in businesses:
+            if biz is None or biz['id'] in self.businesses:
+                continue
+            location = biz.get('location') or {}
+            zip_code = _zip5(location.get('zip_code'))
+            address = canonical_address(location.get('address1'))
+            self.businesses[biz['id']] = biz
+            self._trigrams[biz['id']] = name_trigrams(biz.get('name', ''))
+            self._by_zip[zip_code].append(biz['id'])
+            if isinstance(address, str) and address:
+                self._by_address[zip_code][address].append(biz['id'])
+
+    def _best (self, trigrams, ids, min_similarity):
+        best_id, best = None, min_similarity
+        for biz_id in ids:
+            similarity = _jaccard(trigrams, self._trigrams[biz_id])
+            if similarity >= best:
+                best_id, best = biz_id, similarity
+        return best_id
+
+    def match (self, name, address, zip_code):
+        """Returns business JSON of the best local match of a restaurant, or
+        None if there is none.
+
+        Args:
+            name (str): Restaurant name, e.g. DBA.
+            address (str): Street address, e.g. FULL_ADDRESS.
+            zip_code (Union[int, str]): Zip code.
+        """
+        zip_code = _zip5(zip_code)
+        if zip_code not in self._by_zip:
+            return None
+        trigrams = name_trigrams(name)
+        address = canonical_address(address)
+
+        biz_id = None
+        if isinstance(address, str):
+            same_address = self._by_address[zip_code].get(address, [])
+            biz_id = self._best(trigrams, same_address, MIN_NAME_SIMILARITY)
+        if biz_id is None:
+            biz_id = self._best(trigrams, self._by_zip[zip_code],
+                                MIN_NAME_SIMILARITY_ZIP)
+        return None if biz_id is None else self.businesses[biz_id]
+
+
+def resolve_matches (queries, index, workers=yelp.MAX_WORKERS, client=None):
+    """Matches each (term, location, zip_code) query against index, querying
+    the Yelp API (concurrently) only for those without a local match.
+
+    Returns:
+        (List[dict], List[bool]): Best-matching business JSON (or None) per
+        query, in the same order as queries, and whether each was matched
+        locally.
+    """
+    queries = list(queries)
+    matches = [index.match(*query) for query in queries]
+    local = [biz is not None for biz in matches]
+    misses = [i for i, biz in enumerate(matches) if biz is None]
+    if misses:
+        api_matches = yelp.get_business_matches(
+              [queries[i][:2] for i in misses], workers=workers, client=client)
+        for i, biz in zip(misses, api_matches):
+            matches[i] = biz
+    return matches, local